@@ -5,8 +5,9 @@ from functools import wraps
 from bson.objectid import ObjectId
 from datetime import datetime
 import secrets
-from flask import Response, stream_with_context
+from flask import jsonify
 from services.email_service import send_timetable_update_email, send_original_timetable_email
+from services.job_runner import GenerationWorkerPool
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this to a random secret key
@@ -30,6 +31,14 @@ batch_generation_request_collection = db['batch_generation_request']
 generation_logs_collection = db['generation_logs']
 resource_availability_collection = db['resource_availability']
 
+# Background generation: workers claim QUEUED batch_generation_request documents and run them,
+# so a run doesn't depend on the browser tab or hold a web worker. Threads share `db`; with
+# GENERATION_WORKER_PROCESSES each worker is a process with its own connection.
+GENERATION_WORKERS = 2
+GENERATION_WORKER_PROCESSES = False
+generation_workers = GenerationWorkerPool(db, workers=GENERATION_WORKERS,
+                                          processes=GENERATION_WORKER_PROCESSES, mongo_uri=MONGO_URI)
+
 # Helper Functions
 def hash_password(password):
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt())
@@ -594,17 +603,41 @@ def start_generation():
         flash('Please select at least one batch.', 'danger')
         return redirect(url_for('generate_timetable_multi'))
     
+    # Search engine for run_custom_ga: 'hill_climb', 'annealing', 'tabu', 'population' or 'islands'
+    engine = request.form.get('engine', 'hill_climb')
+    engine_options = {}
+    # Anytime mode: stop at the wall-clock budget (seconds) or after N steps without improvement
+    try:
+        if request.form.get('population_size'):
+            engine_options['population_size'] = int(request.form.get('population_size'))
+        time_limit = float(request.form['time_limit']) if request.form.get('time_limit') else None
+        stagnation_limit = int(request.form['stagnation_limit']) if request.form.get('stagnation_limit') else None
+    except ValueError:
+        flash('Population size, time limit and stagnation limit must be numbers.', 'danger')
+        return redirect(url_for('generate_timetable_multi'))
+    if (time_limit is not None and not 0 < time_limit < float('inf')) or (stagnation_limit is not None and stagnation_limit <= 0):
+        flash('Time limit and stagnation limit must be positive.', 'danger')
+        return redirect(url_for('generate_timetable_multi'))
+    # Warm start: re-optimise from the batches' stored timetables instead of from scratch
+    if request.form.get('warm_start'):
+        engine_options['warm_start'] = True
+    
     # Create Request
     req_id = batch_generation_request_collection.insert_one({
         'batch_ids': [ObjectId(bid) for bid in batch_ids],
+        'engine': engine,
+        'engine_options': engine_options,
+        'time_limit': time_limit,
+        'stagnation_limit': stagnation_limit,
         'status': 'QUEUED',
+        'stage': 'QUEUED',
+        'progress': 0,
         'created_at': datetime.now(),
         'logs': []
     }).inserted_id
     
-    # In a real async app, trigger Celery task here.
-    # For this demo, we might redirect to a monitor that triggers a simplified async process or just runs it (if we can block).
-    # Ideally: Redirect to Monitor -> Monitor JS calls /api/run_generation/<req_id> -> API runs logic (streaming or synchronous update).
+    # A background worker picks the request up; the monitor only polls its progress
+    generation_workers.start()
     
     return redirect(url_for('generation_monitor', req_id=req_id))
 
@@ -616,17 +649,45 @@ def generation_monitor(req_id):
     if not req:
         flash('Request not found', 'danger')
         return redirect(url_for('admin_dashboard'))
+    generation_workers.start() # e.g. after a restart, with requests still queued
     return render_template('generation_monitor.html', req=req, name=session['name'])
 
-@app.route('/admin/run_optimization/<req_id>')
+@app.route('/admin/generation_progress/<req_id>')
 @login_required
 @role_required('admin')
-def run_optimization(req_id):
-    from services.optimization_engine import run_optimization_pipeline
-    
-    # We use stream_with_context to keep the request context active (if needed for db access)
-    # and yield data chunk by chunk to the frontend.
-    return Response(stream_with_context(run_optimization_pipeline(db, req_id)), mimetype='text/plain')
+def generation_progress(req_id):
+    # Polled by the monitor: status, stage, progress and the log lines after ?since=N
+    # (N counts every line logged; the request keeps only the last ones)
+    req = batch_generation_request_collection.find_one(
+        {'_id': ObjectId(req_id)}, {'status': 1, 'stage': 1, 'progress': 1, 'logs': 1, 'log_count': 1, 'error': 1})
+    if not req:
+        return jsonify({'error': 'Not found'}), 404
+    logs = req.get('logs', [])
+    count = req.get('log_count', len(logs))
+    since = request.args.get('since', 0, type=int)
+    first = count - len(logs) # number of the oldest line still kept
+    return jsonify({
+        'status': req.get('status'),
+        'stage': req.get('stage'),
+        'progress': req.get('progress', 0),
+        'error': req.get('error'),
+        'logs': logs[max(0, since - first):] if since <= count else logs,
+        'next': count
+    })
+
+@app.route('/admin/requeue_generation/<req_id>', methods=['POST'])
+@login_required
+@role_required('admin')
+def requeue_generation(req_id):
+    # Runs a failed/interrupted request again; it resumes from its checkpoint if it has one
+    result = batch_generation_request_collection.update_one(
+        {'_id': ObjectId(req_id), 'status': {'$nin': ['QUEUED', 'RUNNING']}},
+        {'$set': {'status': 'QUEUED', 'stage': 'QUEUED', 'progress': 0, 'logs': [], 'log_count': 0}, '$unset': {'error': ''}})
+    if result.modified_count:
+        generation_workers.start()
+    else:
+        flash('This request is already queued or running.', 'info')
+    return redirect(url_for('generation_monitor', req_id=req_id))
 
 @app.route('/admin/timetable/view_multi/<req_id>')
 @login_required
@@ -0,0 +1,60 @@
+class SlotMasks:
+    """
+    Week-long slot sets as plain Python ints: bit t is timeslot t of a
+    TimeGrid (day_idx * n_slots + slot_idx), so 5 days x 8 slots is a 40-bit
+    mask. Feasibility becomes a single AND and runs of consecutive slots a
+    shift-and-AND, with masks keeping runs from spilling across days.
+    """
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.n_slots = grid.n_slots
+        self.full = (1 << grid.size) - 1
+
+        day = (1 << self.n_slots) - 1
+        self.day = [day << (d * self.n_slots) for d in range(grid.n_days)]
+
+        # Bits that can start a run of 3 without leaving the day
+        self.run3_starts = 0
+        for d in range(grid.n_days):
+            for k in range(self.n_slots - 2):
+                self.run3_starts |= 1 << (d * self.n_slots + k)
+
+    def from_slots(self, timeslots):
+        mask = 0
+        for t in timeslots:
+            mask |= 1 << t
+        return mask
+
+    def from_bools(self, row):
+        """Mask from a bool/int sequence indexed by timeslot (e.g. a NumPy row)."""
+        return self.from_slots(t for t, v in enumerate(row) if v)
+
+    def to_slots(self, mask):
+        """Timeslots set in `mask`, ascending."""
+        slots = []
+        while mask:
+            low = mask & -mask
+            slots.append(low.bit_length() - 1)
+            mask ^= low
+        return slots
+
+    def runs_of_3(self, mask):
+        """Start bits of every run of 3 consecutive occupied slots (within a day)."""
+        return mask & (mask >> 1) & (mask >> 2) & self.run3_starts
+
+    def run_through(self, mask, t, length=1):
+        """True if `mask` has more than 2 consecutive slots in a run touching [t, t+length)."""
+        lo = max(t - 2, 0)
+        window = ((1 << (t + length - lo)) - 1) << lo
+        return bool(self.runs_of_3(mask) & window)
+
+    def starts(self, length):
+        """Timeslots where a session of `length` slots fits without crossing a day."""
+        if length <= 1:
+            return self.full
+        mask = 0
+        for d in range(self.grid.n_days):
+            for k in range(self.n_slots - length + 1):
+                mask |= 1 << (d * self.n_slots + k)
+        return mask
@@ -0,0 +1,67 @@
+import time
+import random
+from datetime import datetime
+from bson import ObjectId
+
+
+class ClaimLost(Exception):
+    """Raised by a run whose request was claimed by another worker (see job_runner.py)."""
+
+
+class RunCheckpoint:
+    """
+    Periodic checkpoint of a generation run, stored on its
+    batch_generation_request document under 'checkpoint':
+      - engine, steps done (iterations / generations / island epochs) and elapsed seconds
+      - best score and fitness curve so far
+      - best assignment as [session id, day, slot] rows (session ids are stable
+        between runs of the same request)
+      - state of the run's random generator (a random.Random, or the `random`
+        module itself by default)
+    A run started for a request that has a checkpoint resumes from it instead
+    of starting over. With a `worker` name, saves only go through while the
+    request is still claimed by that worker, and raise ClaimLost otherwise.
+    """
+
+    def __init__(self, db, req_id, interval=30, worker=None):
+        self.db = db
+        self.req_id = ObjectId(req_id)
+        self.interval = interval # seconds between saves
+        self.worker = worker
+        self.last_save = time.monotonic()
+
+    def load(self):
+        req = self.db.batch_generation_request.find_one({'_id': self.req_id}, {'checkpoint': 1})
+        return (req or {}).get('checkpoint')
+
+    def due(self):
+        return time.monotonic() - self.last_save >= self.interval
+
+    def save(self, engine, steps, elapsed, best_score, fitness_curve, assignment, rng=random):
+        # assignment: [(session id, day, slot), ...]
+        version, internal, gauss = rng.getstate()
+        owner = {'_id': self.req_id}
+        if self.worker is not None:
+            owner['worker'] = self.worker
+        result = self.db.batch_generation_request.update_one(
+            owner,
+            {'$set': {'checkpoint': {
+                'engine': engine,
+                'steps': int(steps),
+                'elapsed': float(elapsed),
+                'best_score': float(best_score),
+                'fitness_curve': [float(x) for x in fitness_curve],
+                'assignment': [[sid, day, int(slot)] for sid, day, slot in assignment],
+                'rng_state': [version, list(internal), gauss],
+                'saved_at': datetime.now(),
+            }}}
+        )
+        if not result.matched_count:
+            raise ClaimLost(f"Request {self.req_id} is no longer claimed by {self.worker}")
+        self.last_save = time.monotonic()
+
+    @staticmethod
+    def restore_rng(checkpoint, rng=random):
+        # Pass the run's own generator: runs sharing a process must not reset each other's
+        version, internal, gauss = checkpoint['rng_state']
+        rng.setstate((version, tuple(internal), gauss))
@@ -0,0 +1,85 @@
+import numpy as np
+
+
+class ConflictGraph:
+    """
+    Session conflict graph in compressed sparse row (CSR) form.
+
+    Neighbours of node u are indices[indptr[u]:indptr[u + 1]] (sorted, no
+    self loops, no duplicates). Shared by the heuristic DSATUR ordering and
+    the custom GA so both build the graph the same way.
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    def neighbors(self, u):
+        return self.indices[self.indptr[u]:self.indptr[u + 1]]
+
+    __getitem__ = neighbors
+
+    @property
+    def edge_count(self):
+        return len(self.indices) // 2
+
+    def components(self):
+        """
+        Connected components: returns (labels, count) with labels[u] the
+        component of node u, numbered in order of their first node.
+        """
+        labels = np.full(len(self), -1, dtype=np.int32)
+        count = 0
+        for root in range(len(self)):
+            if labels[root] >= 0:
+                continue
+            labels[root] = count
+            stack = [root]
+            while stack:
+                u = stack.pop()
+                for v in self.neighbors(u).tolist():
+                    if labels[v] < 0:
+                        labels[v] = count
+                        stack.append(v)
+            count += 1
+        return labels, count
+
+
+def build_grouped_graph(n, *key_lists):
+    """
+    Builds the conflict graph of `n` sessions from grouping keys instead of
+    comparing every pair. Each key list gives one key per session (None = not
+    grouped); sessions sharing a key form a clique, e.g. one list of batch ids
+    and one of faculty. Cost is proportional to the number of edges, not n^2.
+    """
+    groups = {}
+    for k, keys in enumerate(key_lists):
+        for i, key in enumerate(keys):
+            if key is not None:
+                groups.setdefault((k, key), []).append(i)
+
+    # Each node's neighbours = members of every clique it belongs to
+    members = [[] for _ in range(n)]
+    for group in groups.values():
+        if len(group) < 2:
+            continue
+        arr = np.asarray(group, dtype=np.int32)
+        for i in group:
+            members[i].append(arr)
+
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    rows = []
+    for i in range(n):
+        if members[i]:
+            row = np.unique(np.concatenate(members[i]))
+            row = row[row != i]
+        else:
+            row = np.empty(0, dtype=np.int32)
+        rows.append(row)
+        indptr[i + 1] = indptr[i] + len(row)
+
+    indices = np.concatenate(rows).astype(np.int32) if rows else np.empty(0, dtype=np.int32)
+    return ConflictGraph(indptr, indices)
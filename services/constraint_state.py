@@ -0,0 +1,283 @@
+import random
+import numpy as np
+from services.encoding import UNPLACED, SessionEncoding
+from services.conflict_graph import build_grouped_graph
+from services.repair import BacktrackingRepair, StateModel
+from services.bitmask import SlotMasks
+from services.incremental_fitness import IncrementalFitness
+
+
+class ConstraintState:
+    """
+    Persistent hard-constraint bookkeeping for the custom GA.
+
+    Instead of re-deriving faculty load, room/lab usage and clashes for the
+    whole assignment on every iteration, we keep occupancy counters that are
+    updated as sessions move. All of them are NumPy matrices over the
+    interned indices of a SessionEncoding (t = timeslot index):
+      - faculty x t   (also covers same-faculty graph clashes)
+      - batch   x t   (covers same-batch graph clashes)
+      - room pool x size class x t (sessions needing at least that room size;
+                      concrete rooms are matched after the search, see RoomPools)
+      - faculty x day load (max_day limit)
+
+    Checking a move only looks at the cells the moved session covers, so the
+    cost is independent of the total number of sessions.
+
+    Next to the counters, every faculty/batch keeps a week bitmask of its
+    occupied timeslots (bit t set while its count is > 0), and every room
+    pool/size class a mask of the timeslots with no room of that size left,
+    so the clash checks in can_place are a single AND and the
+    consecutive-slot rule a shift-and-AND (see SlotMasks).
+    """
+
+    def __init__(self, enc, max_day, rooms, external_faculty):
+        # max_day: per-faculty daily limit (indexed like enc.faculty)
+        # rooms: RoomPools (room types/capacities and their free counts per timeslot)
+        # external_faculty: week bitmasks of slots taken by timetables outside this run
+        self.enc = enc
+        self.n_slots = enc.grid.n_slots
+        self.max_day = [int(m) for m in max_day]
+        self.rooms = rooms
+        self.external_faculty = external_faculty
+
+        # Plain lists for the per-session attributes: scalar access is hot
+        self._faculty = enc.faculty_of.tolist()
+        self._batch = enc.batch.tolist()
+        self._pool = rooms.pool.tolist()
+        self._cls = rooms.cls.tolist()
+        self._length = enc.length.tolist()
+
+        T = enc.grid.size
+        self.position = np.full(len(enc), UNPLACED, dtype=np.int16)
+        self.faculty_busy = np.zeros((len(enc.faculty), T), dtype=np.int16)
+        self.batch_busy = np.zeros((len(enc.batches), T), dtype=np.int16)
+        # pool -> size class c x t: sessions at t needing a room of at least thresholds[c]
+        self.room_demand = [np.zeros_like(free) for free in rooms.free]
+        self.faculty_load = np.zeros((len(enc.faculty), enc.grid.n_days), dtype=np.int16)
+
+        self.masks = SlotMasks(enc.grid)
+        self.faculty_mask = [0] * len(enc.faculty)
+        self.batch_mask = [0] * len(enc.batches)
+        # pool -> size class -> timeslots with every room of that size taken
+        self.room_full = [[self.masks.from_bools(row <= 0) for row in free] for free in rooms.free]
+
+    # ---------------- CHECKS ----------------
+    def can_place(self, i, t):
+        """True if session `i` (currently unplaced) fits at timeslot `t`."""
+        f = self._faculty[i]
+        length = self._length[i]
+        day = t // self.n_slots
+
+        # 1. Faculty Load
+        if self.faculty_load[f, day] + length > self.max_day[f]:
+            return False
+
+        # 2. Global Faculty Conflict (Incremental) + Same-faculty / same-batch clashes
+        cells = ((1 << length) - 1) << t
+        f_busy = self.faculty_mask[f]
+        if cells & (self.external_faculty[f] | f_busy | self.batch_mask[self._batch[i]]):
+            return False
+
+        # 3. Room/Resource Check: a room of the session's size (or bigger) must be left
+        p = self._pool[i]
+        if p >= 0:
+            for full in self.room_full[p][:self._cls[i] + 1]:
+                if cells & full:
+                    return False
+
+        # 4. Consecutive Slot Constraint (no more than 2 in a row)
+        # Only a run through the new cells can change, so only those count.
+        return not self.masks.run_through(f_busy | cells, t, length)
+
+    def can_move(self, i, t):
+        """True if moving session `i` from its current position to `t` keeps it feasible."""
+        old = int(self.position[i])
+        if old != UNPLACED:
+            self._update(i, old, -1)
+        ok = self.can_place(i, t)
+        if old != UNPLACED:
+            self._update(i, old, 1)
+        return ok
+
+    # ---------------- UPDATES ----------------
+    def apply_move(self, i, t):
+        """Moves (or places) session `i` at `t`. Returns the previous position for undo_move."""
+        old = int(self.position[i])
+        if old != UNPLACED:
+            self._update(i, old, -1)
+        self._update(i, t, 1)
+        return old
+
+    def undo_move(self, i, old):
+        """Reverts an apply_move given the position it returned."""
+        self._update(i, int(self.position[i]), -1)
+        if old != UNPLACED:
+            self._update(i, old, 1)
+
+    def apply_moves(self, moves):
+        """
+        Moves several sessions at once (a swap or Kempe chain): all of them are
+        lifted first, then placed one by one. Returns the previous positions for
+        undo_moves, or None (state unchanged) if any placement is infeasible.
+        """
+        old = [int(self.position[i]) for i, _ in moves]
+        for (i, _), o in zip(moves, old):
+            if o != UNPLACED:
+                self._update(i, o, -1)
+
+        placed = []
+        for i, t in moves:
+            if not self.can_place(i, t):
+                break
+            self._update(i, t, 1)
+            placed.append((i, t))
+        else:
+            return old
+
+        for i, t in placed:
+            self._update(i, t, -1)
+        for (i, _), o in zip(moves, old):
+            if o != UNPLACED:
+                self._update(i, o, 1)
+        return None
+
+    def undo_moves(self, moves, old):
+        """Reverts an apply_moves given the positions it returned."""
+        for i, t in moves:
+            self._update(i, t, -1)
+        for (i, _), o in zip(moves, old):
+            if o != UNPLACED:
+                self._update(i, o, 1)
+
+    def _update(self, i, t, sign):
+        f = self._faculty[i]
+        length = self._length[i]
+        end = t + length
+
+        self.faculty_load[f, t // self.n_slots] += sign * length
+        self.faculty_busy[f, t:end] += sign
+        self._sync(self.faculty_mask, f, self.faculty_busy[f], t, end)
+        b = self._batch[i]
+        self.batch_busy[b, t:end] += sign
+        self._sync(self.batch_mask, b, self.batch_busy[b], t, end)
+
+        p = self._pool[i]
+        if p >= 0:
+            demand = self.room_demand[p]
+            free = self.rooms.free[p]
+            full = self.room_full[p]
+            for c in range(self._cls[i] + 1):
+                demand[c, t:end] += sign
+                m = full[c]
+                for cell in range(t, end):
+                    if demand[c, cell] >= free[c, cell]:
+                        m |= 1 << cell
+                    else:
+                        m &= ~(1 << cell)
+                full[c] = m
+
+        self.position[i] = t if sign > 0 else UNPLACED
+
+    @staticmethod
+    def _sync(masks, k, counts, t, end):
+        # Bit c of masks[k] mirrors counts[c] > 0 for the touched cells
+        m = masks[k]
+        for c in range(t, end):
+            if counts[c] > 0:
+                m |= 1 << c
+            else:
+                m &= ~(1 << c)
+        masks[k] = m
+
+
+class GAProblem:
+    """
+    Everything needed to rebuild a ConstraintState for a run: the encoding,
+    per-session domains (allowed timeslots) and the fixed limits/external busy
+    state. Plain data, so it can be shipped once to worker processes.
+    """
+
+    def __init__(self, enc, domain_masks, max_day, rooms, external_faculty, conflicts=None,
+                 anchor=None, deviation_penalty=0):
+        self.enc = enc
+        self.conflicts = conflicts    # ConflictGraph over session indices (for Kempe-chain moves)
+        self.domain_masks = domain_masks # session index -> bitmask of allowed timeslots
+        # session index -> list of allowed timeslots; sessions with the same mask share one list
+        masks = SlotMasks(enc.grid)
+        shared = {}
+        self.domain = {}
+        for i, m in domain_masks.items():
+            if m not in shared:
+                shared[m] = masks.to_slots(m)
+            self.domain[i] = shared[m]
+        self.max_day = max_day
+        self.rooms = rooms            # RoomPools
+        self.external_faculty = external_faculty
+        self.anchor = anchor          # warm start: previous timeslot per session (or None)
+        self.deviation_penalty = deviation_penalty
+
+    def new_state(self):
+        return ConstraintState(self.enc, self.max_day, self.rooms, self.external_faculty)
+
+    def new_scorer(self, solution):
+        return IncrementalFitness(self.enc, solution, self.anchor, self.deviation_penalty)
+
+    def subproblem(self, indices, rooms):
+        """
+        The same problem restricted to the sessions `indices` (e.g. one
+        independent component, see decomposition.py), with its own RoomPools.
+        Session k of the subproblem is session indices[k] of this one.
+        """
+        enc = self.enc
+        sessions = [enc.session_data[i] for i in indices]
+        sub = SessionEncoding(sessions, enc.grid, dict.fromkeys(s["batch_id"] for s in sessions))
+        conflicts = build_grouped_graph(len(sessions),
+                                        [s["batch_id"] for s in sessions],
+                                        [s["faculty"] for s in sessions])
+        return GAProblem(sub,
+                         {k: self.domain_masks[i] for k, i in enumerate(indices)},
+                         [self.max_day[enc.faculty[name]] for name in sub.faculty.names],
+                         rooms,
+                         [self.external_faculty[enc.faculty[name]] for name in sub.faculty.names],
+                         conflicts,
+                         anchor=self.anchor[indices] if self.anchor is not None else None,
+                         deviation_penalty=self.deviation_penalty)
+
+    def repair(self, solution, rng=random):
+        """
+        Rebuilds a feasible state from a (possibly clashing) solution, e.g. a
+        crossover child. Sessions keep their position when it still fits;
+        the rest are moved to the first feasible slot of their domain, or
+        placed by a short backtracking repair that may shift their neighbours.
+        Returns (state, forced) where `forced` counts sessions that had no
+        feasible slot and were placed anyway (soft fail).
+        """
+        state = self.new_state()
+        order = [i for i, t in enumerate(solution.tolist()) if t != UNPLACED]
+        rng.shuffle(order)
+
+        displaced = []
+        for i in order:
+            t = int(solution[i])
+            if state.can_place(i, t):
+                state.apply_move(i, t)
+            else:
+                displaced.append(i)
+
+        stuck = []
+        for i in displaced:
+            slots = list(self.domain.get(i, ()))
+            rng.shuffle(slots)
+            for t in slots:
+                if state.can_place(i, t):
+                    state.apply_move(i, t)
+                    break
+            else:
+                stuck.append(i)
+
+        # Small budget: repair runs for every crossover child
+        stuck = BacktrackingRepair(StateModel(self, state, rng), max_nodes=200, max_total=1000).run(stuck)
+        for i in stuck:
+            state.apply_move(i, int(solution[i]))
+        return state, len(stuck)
@@ -1,25 +1,78 @@
-import networkx as nx
 import random
+import numpy as np
 from collections import defaultdict
-import copy
 from bson import ObjectId
+from services.ga_config import DAYS, SLOTS
+from services.constraint_state import GAProblem
+from services.population_ga import PopulationGA
+from services.island_model import IslandModel
+from services.local_search import make_strategy
+from services.encoding import TimeGrid, SessionEncoding, UNPLACED
+from services.conflict_graph import build_grouped_graph
+from services.dsatur import dsatur_coloring
+from services.bitmask import SlotMasks
+from services.search_budget import SearchBudget
+from services.faculty_assignment import assign_faculty
+from services.room_allocation import RoomPools
+from services.checkpoint import RunCheckpoint
+from services.decomposition import Decomposition
+from services.repair import BacktrackingRepair, StateModel
+
+ITERATIONS = 1000 # Default when the request sets no time budget / stagnation limit
+DEVIATION_PENALTY = 10 # Warm start: default fitness cost of moving a session away from its old slot
+
+
+def _with_checkpoints(events, save):
+    """Passes an engine's events through, handing its CHECKPOINT events to `save`; returns its result."""
+    while True:
+        try:
+            event = next(events)
+        except StopIteration as stop:
+            return stop.value
+        if event[0] == "CHECKPOINT":
+            msg = save(*event[1])
+            if msg:
+                yield ("LOG", msg)
+        else:
+            yield event
 
-# ---------------- CONFIG ----------------
-DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
-SLOTS = list(range(1, 9))   # slot 9 blocked
-FN_SLOTS = {1, 2, 3, 4}
-AN_SLOTS = {5, 6, 7, 8}
 
-def run_custom_ga(db, batch_ids, log_callback=None):
+def run_custom_ga(db, batch_ids, log_callback=None, engine="hill_climb", options=None, checkpoint=None):
     """
     Executes the Custom Genetic Algorithm for the given batches.
-    Yields ("LOG", message) or ("RESULT", (timetables, fitness_curve))
+    engine: a local-search strategy ("hill_climb", "annealing", "tabu"),
+            "population" (PopulationGA on a process pool)
+            or "islands" (IslandModel, one process per island with migration).
+    options: engine settings, e.g. iterations, initial_temp, cooling, alpha, tenure,
+             population_size, generations, crossover, workers,
+             islands, epochs, migration_interval, strategy,
+             time_limit (wall-clock seconds for the whole run) and stagnation
+             (iterations, or generations for "population", without improvement).
+             With either of those set the step counts default to unlimited and
+             the search runs until the deadline / stagnation, keeping its best so far.
+             warm_start: start from the stored timetables of these batches - sessions
+             keep their old faculty and slot where still valid, only new or invalidated
+             ones are placed, and every moved session costs deviation_penalty.
+             decompose (default True): local-search engines solve independent
+             components (batches sharing no faculty) in parallel, on `workers` processes.
+    checkpoint: optional RunCheckpoint. The best assignment, RNG state and step
+                count are saved to it periodically, and a run that finds a saved
+                checkpoint for the same engine continues from it.
+    Yields ("LOG", message), ("PROGRESS", fraction) or ("RESULT", (timetables, fitness_curve))
     """
     # Helper to yield log and optionally call callback (for backward compat if needed)
     def log(msg):
         pass # We will yield directly, but keep this for internal logic if needed
     
     yield ("LOG", f"Starting Custom GA for {len(batch_ids)} batches...")
+    options = options or {}
+    # The run's own generator (seeded from `random`, so random.seed() still reproduces a run):
+    # concurrent runs in one process, e.g. worker threads, must not share or reset each other's
+    rng = random.Random(random.getrandbits(64))
+    # Wall-clock budget starts now so data loading and DSATUR count against it
+    deadline = SearchBudget(time_limit=options.get("time_limit"))
+    stagnation = options.get("stagnation")
+    anytime = deadline.time_limit is not None or stagnation is not None
 
     # ---------------- 1 DATA FETCHING ----------------
     batches = list(db.batches.find({'_id': {'$in': [ObjectId(bid) for bid in batch_ids]}}))
@@ -51,6 +104,21 @@ def run_custom_ga(db, batch_ids, log_callback=None):
                      occupied_rooms[details['room']][day].add(s_int)
                      
     yield ("LOG", f"Found {len(existing_timetables)} existing timetables to respect.")
+
+    # Warm start: the stored timetables of the batches being generated are the starting plan
+    warm_start = bool(options.get("warm_start"))
+    previous = defaultdict(list) # (batch id, course/lab code) -> [(day, slot, faculty, is lab), ...] in week order
+    if warm_start:
+        day_order = {d: i for i, d in enumerate(DAYS)}
+        old_timetables = list(db.timetables.find({'batch_id': {'$in': current_batch_ids}}))
+        for tt in old_timetables:
+            b_id = str(tt['batch_id'])
+            for day, slots in sorted(tt.get('timetable', {}).items(), key=lambda kv: day_order.get(kv[0], len(DAYS))):
+                for slot_num, details in sorted(slots.items(), key=lambda kv: int(kv[0])):
+                    if details and 'code' in details:
+                        previous[(b_id, details['code'])].append((day, int(slot_num), details.get('faculty_name'),
+                                                                  str(details.get('type', '')).upper() == 'LAB'))
+        yield ("LOG", f"Warm Start: {len(old_timetables)} stored timetables of these batches")
     
     # Pre-fetch courses and labs to avoid N+1 queries
     course_ids = set()
@@ -67,40 +135,86 @@ def run_custom_ga(db, batch_ids, log_callback=None):
     # 1. BATCHES
     BATCH_NAMES = [b['name'] for b in batches]
     
-    # 2. ROOMS (Simple allocation strategy: Round-robin assign Lecture Halls to Batches)
-    lecture_halls = [r['number'] for r in all_rooms if r.get('type') == 'Lecture Hall']
-    LAB_ROOMS = [r['number'] for r in all_rooms if r.get('type') == 'Lab']
-    
-    BATCH_ROOMS = {}
-    for i, batch in enumerate(batches):
-        b_id_str = str(batch['_id'])
-        if lecture_halls:
-            BATCH_ROOMS[b_id_str] = lecture_halls[i % len(lecture_halls)]
-        else:
-            BATCH_ROOMS[b_id_str] = "TBD"
+    # 2. ROOMS (pools by session type; concrete rooms are matched per timeslot after the search)
+    ROOM_POOLS = {
+        "theory": [r for r in all_rooms if r.get('type') == 'Lecture Hall'],
+        "lab": [r for r in all_rooms if r.get('type') == 'Lab'],
+    }
 
-    yield ("LOG", f"Room Allocation: {BATCH_ROOMS}")
-    yield ("LOG", f"Available Labs: {LAB_ROOMS}")
+    yield ("LOG", f"Available Lecture Halls: {[r['number'] for r in ROOM_POOLS['theory']]}")
+    yield ("LOG", f"Available Labs: {[r['number'] for r in ROOM_POOLS['lab']]}")
 
     # 3. FACULTY MAPPING
-    # Map DB Faculty to the structure: name -> {off, max_day}
+    # Map DB Faculty to the structure: name -> {off, max_day, unavailable}
+    # All availability constraints come in one query instead of one per faculty
+    unavailable_by_id = defaultdict(list) # faculty id -> ["Mon_1", ...]
+    for c in db.constraints.find({"rule": "TEACHER_AVAILABILITY"}):
+        unavailable_by_id[str(c['entity_id'])].extend(c.get('data', {}).get('unavailable_slots', []))
+
     faculty_config = {}
     for f in all_faculty:
-        # Check if they have availability constraints
-        constraint = db.constraints.find_one({"rule": "TEACHER_AVAILABILITY", "entity_id": str(f['_id'])})
-        off_day = None
-        # Simplified: If they have ANY unavailable slot on a day, we might mark that day as 'off' strictly 
-        # OR better: The original code supports 'off' as a full day. 
-        # Let's see if we can derive a 'max_day' constraint or just use default.
+        unavailable = []
+        for slot_str in unavailable_by_id.get(str(f['_id']), []): # e.g. "Mon_1"
+            day, _, slot = slot_str.partition('_')
+            if slot.isdigit():
+                unavailable.append((day, int(slot)))
         limit = 4 # Default max slots per day
-        faculty_config[f['name']] = {"off": off_day, "max_day": limit}
-
-    # 4. SEMESTER PLAN CONSTRUCTION
+        faculty_config[f['name']] = {"off": None, "max_day": limit, "unavailable": unavailable}
+
+    # 4. FACULTY ASSIGNMENT (load-balanced instead of a random pick per course)
+    # Weekly capacity = per day, max_day capped by the slots not already booked/unavailable
+    capacity = {}
+    for name, cfg in faculty_config.items():
+        blocked = defaultdict(set)
+        for d, sl in cfg["unavailable"]:
+            blocked[d].add(sl)
+        for d, busy in occupied_faculty.get(name, {}).items():
+            blocked[d] |= busy
+        capacity[name] = sum(min(cfg["max_day"], len(SLOTS) - len(blocked[d] & set(SLOTS))) for d in DAYS)
+
+    demands = []
+    qualified = {}
+    for batch in batches:
+        b_id = str(batch['_id'])
+        for c_id in batch.get('courses', []):
+            c_str = str(c_id)
+            if c_str not in courses_map: continue
+            key = (b_id, "course", c_str)
+            demands.append((key, int(courses_map[c_str].get('credits', 4))))
+            qualified[key] = [f['name'] for f in all_faculty if c_str in f.get('qualified_courses', [])]
+        for l_id in batch.get('labs', []):
+            l_str = str(l_id)
+            if l_str not in labs_map: continue
+            key = (b_id, "lab", l_str)
+            demands.append((key, 2))
+            qualified[key] = [f['name'] for f in all_faculty if l_str in f.get('qualified_labs', [])]
+
+    # Warm start: a course keeps its old teacher while they are still qualified
+    fixed = {}
+    if warm_start:
+        for key, _ in demands:
+            b_id, kind, ref = key
+            code = (courses_map if kind == "course" else labs_map)[ref]['code']
+            old = {fac for _, _, fac, _ in previous.get((b_id, code), ())}
+            if len(old) == 1 and next(iter(old)) in qualified.get(key, ()):
+                fixed[key] = old.pop()
+
+    faculty_choice = assign_faculty(demands, qualified, capacity, fixed)
+    fac_load = defaultdict(int)
+    for key, load in demands:
+        if key in faculty_choice:
+            fac_load[faculty_choice[key]] += load
+    overloaded = {f: l for f, l in fac_load.items() if l > capacity.get(f, 0)}
+    yield ("LOG", f"Faculty Assignment: {len(faculty_choice)} courses over {len(fac_load)} faculty"
+                  + (f", over capacity: {overloaded}" if overloaded else ""))
+
+    # 5. SEMESTER PLAN CONSTRUCTION
     semester_plan = {}
     
     for batch in batches:
         plan = []
         b_name = batch['name']
+        b_id = str(batch['_id'])
         
         # Theory Courses
         for c_id in batch.get('courses', []):
@@ -108,13 +222,7 @@ def run_custom_ga(db, batch_ids, log_callback=None):
             if c_str not in courses_map: continue
             course = courses_map[c_str]
             
-            # Find a qualified faculty
-            qualified_faculty = []
-            for f in all_faculty:
-                if c_str in f.get('qualified_courses', []):
-                    qualified_faculty.append(f['name'])
-            
-            assigned_faculty = random.choice(qualified_faculty) if qualified_faculty else "Staff"
+            assigned_faculty = faculty_choice.get((b_id, "course", c_str), "Staff")
             
             pref_session = course.get('preferred_session') # 'FN', 'AN', or None/Empty
             
@@ -133,12 +241,7 @@ def run_custom_ga(db, batch_ids, log_callback=None):
             if l_str not in labs_map: continue
             lab = labs_map[l_str]
             
-            qualified_faculty = []
-            for f in all_faculty:
-                if l_str in f.get('qualified_labs', []):
-                    qualified_faculty.append(f['name'])
-            
-            assigned_faculty = random.choice(qualified_faculty) if qualified_faculty else "Staff"
+            assigned_faculty = faculty_choice.get((b_id, "lab", l_str), "Staff")
             
             plan.append({
                 "code": lab['code'],
@@ -151,7 +254,7 @@ def run_custom_ga(db, batch_ids, log_callback=None):
             })
             
             
-        semester_plan[str(batch['_id'])] = plan
+        semester_plan[b_id] = plan
 
     # ---------------- STEP 1: CREATE SESSIONS ----------------
     yield ("LOG", "Creating sessions...")
@@ -172,7 +275,8 @@ def run_custom_ga(db, batch_ids, log_callback=None):
                         "course_name": c["name"],
                         "faculty": c["faculty"],
                         "type": "theory",
-                        "pref_session": c["pref_session"]
+                        "pref_session": c["pref_session"],
+                        "batch_size": int(batch.get('size') or 0)
                     })
             else:
                 sessions.append({
@@ -183,322 +287,259 @@ def run_custom_ga(db, batch_ids, log_callback=None):
                     "course_name": c["name"],
                     "faculty": c["faculty"],
                     "type": "lab",
-                    "pref_session": c["pref_session"]
+                    "pref_session": c["pref_session"],
+                    "batch_size": int(batch.get('size') or 0)
                 })
 
     yield ("LOG", f"Total Sessions: {len(sessions)}")
 
     # ---------------- STEP 2: CONFLICT GRAPH ----------------
-    G = nx.Graph()
-    for s in sessions:
-        G.add_node(s["id"], data=s)
-
-    for i in range(len(sessions)):
-        for j in range(i + 1, len(sessions)):
-            a, b = sessions[i], sessions[j]
-            if a["batch_id"] == b["batch_id"] or a["faculty"] == b["faculty"]:
-                G.add_edge(a["id"], b["id"])
+    # Sessions conflict only within a batch clique or a shared-faculty clique,
+    # so group on those instead of comparing every pair. Nodes = session indices.
+    conflicts = build_grouped_graph(len(sessions),
+                                    [s["batch_id"] for s in sessions],
+                                    [s["faculty"] for s in sessions])
+    yield ("LOG", f"Conflict Graph: {conflicts.edge_count} edges")
+
+    # ---------------- STEP 2b: INTEGER ENCODING ----------------
+    # Sessions/faculty/batches become dense indices, (day, slot) a timeslot index
+    grid = TimeGrid(DAYS, SLOTS)
+    enc = SessionEncoding(sessions, grid, [str(b['_id']) for b in batches])
+
+    # Busy slots from other timetables as week bitmasks (bit t = timeslot t)
+    slot_masks = SlotMasks(grid)
+    external_faculty = [0] * len(enc.faculty)
+    for fac, days in occupied_faculty.items():
+        f = enc.faculty.get(fac)
+        if f is None: continue
+        for d, busy in days.items():
+            for sl in busy:
+                if d in grid.day_index and sl in grid.slot_index:
+                    external_faculty[f] |= 1 << grid.index(d, sl)
+
+    # TEACHER_AVAILABILITY: unavailable slots are busy like slots taken by other timetables,
+    # so they drop out of the domains and block the second half of a lab too
+    for fac in enc.faculty.names:
+        f = enc.faculty[fac]
+        for d, sl in faculty_config.get(fac, {}).get("unavailable", ()):
+            if d in grid.day_index and sl in grid.slot_index:
+                external_faculty[f] |= 1 << grid.index(d, sl)
+
+    external_rooms = defaultdict(int) # room number -> mask
+    for room, days in occupied_rooms.items():
+        for d, busy in days.items():
+            for sl in busy:
+                if d in grid.day_index and sl in grid.slot_index:
+                    external_rooms[room] |= 1 << grid.index(d, sl)
+
+    # Room capacity model: per timeslot, sessions needing a room of at least their
+    # batch size may not outnumber the free rooms that big
+    rooms = RoomPools(grid, ROOM_POOLS, sessions, external_rooms)
+
+    max_day = [faculty_config.get(fac, {"max_day": 4})["max_day"] for fac in enc.faculty.names]
 
     # ---------------- STEP 3: INITIAL ASSIGNMENT (DSATUR) ----------------
     yield ("LOG", "Running DSATUR Initialization...")
-    TIME_SLOTS = [(d, s) for d in DAYS for s in SLOTS]
-    domain = {}
-    
-    for s in sessions:
-        allowed = []
-        for d, sl in TIME_SLOTS:
+    # Domains are bitmasks of allowed start timeslots. They only depend on the
+    # faculty, session type and preference, so each such group computes its mask once.
+    lab_starts = slot_masks.starts(2) # Lab needs 2 slots, can't start at 8
+    group_masks = {}
+    domain_masks = {}
+
+    for idx, s in enumerate(sessions):
+        key = (s["faculty"], s["type"], s["pref_session"])
+        if key not in group_masks:
             # 0. Check GLOBAL Occupation (Incremental)
-            if sl in occupied_faculty[s["faculty"]][d]:
-                continue
-            
-            # Check occupied room if known (Theory only usually)
-            if s["type"] != "lab":
-                 # We don't know the exact room at this stage for theory unless pre-assigned
-                 # But if we did, we'd check `occupied_rooms`
-                 pass
+            allowed = slot_masks.full & ~external_faculty[enc.faculty_of[idx]]
 
             fac_data = faculty_config.get(s["faculty"], {"off": None, "max_day": 4})
-            if fac_data["off"] and d == fac_data["off"]:
-                continue
-            # if s["pref_session"] == 'FN' and sl not in FN_SLOTS: continue (Softened)
-            # if s["pref_session"] == 'AN' and sl not in AN_SLOTS: continue (Softened)
-            if s["type"] == "lab" and sl >= 8: # Lab needs 2 slots, can't start at 8
+            if fac_data["off"] and fac_data["off"] in grid.day_index:
+                allowed &= ~slot_masks.day[grid.day_index[fac_data["off"]]]
+            # FN/AN preference is soft (scored by the fitness), so it does not narrow the mask
+            if s["type"] == "lab":
+                allowed &= lab_starts
+            group_masks[key] = allowed
+        domain_masks[idx] = group_masks[key]
+
+    # Warm start anchor: each session's timeslot in the stored timetable (UNPLACED = new).
+    # Theory sessions of a course take its stored slots in order, a lab the start of its pair.
+    anchor = None
+    if warm_start:
+        anchor = np.full(len(sessions), UNPLACED, dtype=np.int16)
+        for (b_id, code), rows in previous.items():
+            lab = [(d, sl) for d, sl, _, is_lab in rows if is_lab]
+            theory = [(d, sl) for d, sl, _, is_lab in rows if not is_lab]
+            ids = [f"{b_id}_{code}_{n}" for n in range(len(theory))] + [f"{b_id}_{code}_LAB"] * bool(lab)
+            for sid, (d, sl) in zip(ids, theory + lab[:1]):
+                i = enc.sessions.get(sid)
+                if i is not None and d in grid.day_index and sl in grid.slot_index:
+                    anchor[i] = grid.index(d, sl)
+
+    # Persistent hard-constraint state shared by initialization and the GA loop
+    problem = GAProblem(enc, domain_masks, max_day, rooms, external_faculty, conflicts,
+                        anchor=anchor, deviation_penalty=options.get("deviation_penalty", DEVIATION_PENALTY))
+    state = problem.new_state()
+
+    if anchor is not None:
+        # Old placements that are still in the domain and feasible are kept as is;
+        # DSATUR below only places the new and invalidated sessions
+        invalidated = 0
+        for i, t in enumerate(anchor.tolist()):
+            if t == UNPLACED:
                 continue
-            allowed.append((d, sl))
-        domain[s["id"]] = allowed
-
-    faculty_load = defaultdict(lambda: defaultdict(int))
-    room_usage = defaultdict(lambda: defaultdict(set)) 
-    lab_usage_count = defaultdict(lambda: defaultdict(int))
-    faculty_slots = defaultdict(lambda: defaultdict(set)) # Track slots for consecutive constraint
-    assignment = {}
-
-    try:
-        # Fallback if graph is empty
-        if not G.nodes():
-            nodes_to_color = []
-        else:
-            nodes_to_color = nx.coloring.greedy_color(G, strategy="DSATUR")
-    except Exception as e:
-        yield ("LOG", f"DSATUR Error: {e}, falling back to list")
-        nodes_to_color = list(G.nodes())
+            if domain_masks[i] >> t & 1 and state.can_place(i, t):
+                state.apply_move(i, t)
+            else:
+                invalidated += 1
+        kept = int((state.position != UNPLACED).sum())
+        yield ("LOG", f"Warm Start: kept {kept} sessions in place, {invalidated} invalidated, "
+                      f"{len(sessions) - kept - invalidated} new")
 
-    for node in nodes_to_color:
-        s = G.nodes[node]["data"]
-        possible_slots = domain.get(node, TIME_SLOTS)
-        random.shuffle(possible_slots)
+    # DSATUR order (the coloring dict is in coloring order); same engine as the heuristic scheduler
+    nodes_to_color = list(dsatur_coloring(conflicts, len(sessions)))
 
-        if s["type"] != "lab":
-            required_room = BATCH_ROOMS.get(s["batch_id"], "Unknown")
+    unplaced = []
+    for node in nodes_to_color:
+        if state.position[node] != UNPLACED:
+            continue # kept from the warm start
+        possible_slots = list(problem.domain.get(node, ()))
+        rng.shuffle(possible_slots)
+
+        for t in possible_slots:
+            if state.can_place(node, t):
+                state.apply_move(node, t)
+                break
         else:
-            required_room = None 
-
-        for (day, slot) in possible_slots:
-            fac = s["faculty"]
-            needed = 2 if s["type"] == "lab" else 1
-            
-            # 1. Faculty Load
-            if faculty_load[fac][day] + needed > faculty_config.get(fac, {"max_day":4})["max_day"]:
-                continue
-
-            # 2. Room/Resource Check
-            if s["type"] != "lab":
-                if required_room and required_room in room_usage[day][slot]:
-                    continue
-            else:
-                # Lab Pool Check
-                if len(LAB_ROOMS) > 0:
-                    if lab_usage_count[day][slot] >= len(LAB_ROOMS): continue
-                    if lab_usage_count[day][slot+1] >= len(LAB_ROOMS): continue
-
-            # 3. Graph Conflicts
-            conflict = False
-            for neigh in G.neighbors(node):
-                if neigh in assignment:
-                    n_day, n_slot = assignment[neigh]
-                    if n_day == day and n_slot == slot:
-                        conflict = True; break
-                    if s['type'] == 'lab' and n_day == day and n_slot == slot + 1:
-                        conflict = True; break
-                    if G.nodes[neigh]["data"]['type'] == 'lab' and n_day == day and n_slot + 1 == slot:
-                        conflict = True; break
-            
-            if conflict:
-                continue
-
-            # 4. Consecutive Slot Constraint Check
-            # Temporarily add slots to see if it violates limit
-            temp_slots = sorted(list(faculty_slots[fac][day] | {slot} | ({slot+1} if s["type"]=="lab" else set())))
-            consecutive = 0
-            last_sl = -1
-            too_many = False
-            for sl_chk in temp_slots:
-                 if sl_chk == last_sl + 1:
-                     consecutive += 1
-                 else:
-                     consecutive = 1
-                 last_sl = sl_chk
-                 if consecutive > 2:
-                     too_many = True; break
-            
-            if too_many:
-                continue
+            unplaced.append(node)
 
-            # Assign
-            assignment[node] = (day, slot)
-            faculty_load[fac][day] += needed
-            faculty_slots[fac][day].add(slot)
-            if s["type"] == "lab":
-                faculty_slots[fac][day].add(slot + 1)
-            
-            if s["type"] != "lab":
-                room_usage[day][slot].add(required_room)
-            else:
-                lab_usage_count[day][slot] += 1
-                lab_usage_count[day][slot+1] += 1
-                
-            break
-            
-        if node not in assignment:
+    if unplaced:
+        # Backtracking repair (MRV + forward checking) over each failure and its neighbourhood
+        failed = BacktrackingRepair(StateModel(problem, state, rng)).run(unplaced)
+        yield ("LOG", f"Repair: placed {len(unplaced) - len(failed)} of {len(unplaced)} sessions DSATUR could not")
+        for node in failed:
             # Force random assignment if no legal slot (Soft fail)
+            possible_slots = problem.domain.get(node)
             if possible_slots:
-                assignment[node] = random.choice(possible_slots)
-
-    # ---------------- STEP 4 & 5: FITNESS & HARD CONSTRAINTS ----------------
-    
-    def hard_ok(assign):
-        f_load = defaultdict(lambda: defaultdict(int))
-        r_usage = defaultdict(lambda: defaultdict(set))
-        l_usage = defaultdict(lambda: defaultdict(int)) 
-        
-        # Structure to track slots for consecutive check: faculty -> day -> set(slots)
-        f_slots = defaultdict(lambda: defaultdict(set))
-
-        for node, (d, sl) in assign.items():
-            s = G.nodes[node]["data"]
-            fac = s["faculty"]
-            needed = 2 if s["type"] == "lab" else 1
-            
-            f_load[fac][d] += needed
-            if f_load[fac][d] > faculty_config.get(fac, {"max_day":4})["max_day"]:
-                return False
-                
-            # Check Global Faculty Conflict (Incremental)
-            if sl in occupied_faculty[fac][d]: return False
-            if s["type"] == "lab":
-                if (sl+1) in occupied_faculty[fac][d]: return False
-            
-            # Track slots for consecutive check
-            f_slots[fac][d].add(sl)
-            if s["type"] == "lab":
-                f_slots[fac][d].add(sl + 1)
-            
-            if s["type"] == "lab":
-                 if len(LAB_ROOMS) > 0:
-                     if l_usage[d][sl] >= len(LAB_ROOMS): return False
-                     l_usage[d][sl] += 1
-                     if l_usage[d][sl+1] >= len(LAB_ROOMS): return False
-                     l_usage[d][sl+1] += 1
-            else:
-                room = BATCH_ROOMS.get(s["batch_id"], "Unknown")
-                
-                # Check Global Room Conflict (Incremental)
-                if sl in occupied_rooms[room][d]: return False
-                
-                if room in r_usage[d][sl]: return False
-                r_usage[d][sl].add(room)
-                
-            for neigh in G.neighbors(node):
-                if neigh in assign:
-                    n_day, n_slot = assign[neigh]
-                    if n_day == d and n_slot == sl: return False
-                    if s["type"] == "lab" and n_day == d and n_slot == sl+1: return False
-                    if G.nodes[neigh]["data"]["type"] == "lab" and n_day == d and n_slot+1 == sl: return False
-
-        # Check Consecutive Slots
-        for fac in f_slots:
-            for d in f_slots[fac]:
-                slots = sorted(list(f_slots[fac][d]))
-                consecutive = 0
-                last_slot = -1
-                for sl in slots:
-                    if sl == last_slot + 1:
-                        consecutive += 1
-                    else:
-                        consecutive = 1
-                    last_slot = sl
-                    
-                    if consecutive > 2:
-                        return False
-
-        return True
-
-    def fitness(assign):
-        score = 0
-        tt = defaultdict(lambda: defaultdict(list))
-        tt_details = defaultdict(lambda: defaultdict(list))
-
-        for node, (d, sl) in assign.items():
-            s = G.nodes[node]["data"]
-            tt[s["batch_id"]][d].append(sl)
-            tt_details[s["batch_id"]][d].append(s)
-            if s["type"] == "lab":
-                tt[s["batch_id"]][d].append(sl+1)
-            
-            # --- SOFT CONSTRAINT: Session Preference ---
-            # Penalty for violation, allowing flexibility for hard constraints
-            if s.get("pref_session") == 'FN' and sl not in FN_SLOTS:
-                score -= 20 # Penalty
-            elif s.get("pref_session") == 'AN' and sl not in AN_SLOTS:
-                score -= 20 # Penalty
-                
-        for batch in batches:
-            b_id = str(batch['_id'])
-            for d in DAYS:
-                slots = sorted(tt[b_id][d])
-                details = tt_details[b_id][d]
-                
-                if not slots:
-                    score -= 15  
-                else:
-                    gaps = (slots[-1] - slots[0] + 1) - len(slots)
-                    score -= gaps * 5
-                    
-                    if len(slots) > 5:
-                        score -= (len(slots) - 5) * 10
-
-                    avg_slots = sum(len(tt[b_id][dx]) for dx in DAYS if tt[b_id][dx]) / 5
-                    score -= abs(len(slots) - avg_slots) * 2
-
-                day_map = {}
-                for node, (day_a, slot_a) in assign.items():
-                     if G.nodes[node]["data"]["batch_id"] == b_id and day_a == d:
-                         day_map[slot_a] = G.nodes[node]["data"]["type"]
-                
-                for sl in slots:
-                    if sl > 4 and day_map.get(sl) == "theory":
-                        score -= 2 
-                
-                lab_count = sum(1 for s in details if s["type"] == "lab")
-                if lab_count > 1:
-                    score -= 20
-        
-        return score
+                state.apply_move(node, rng.choice(possible_slots))
+
+    solution = state.position.copy()
+    yield ("LOG", f"Initial Conflicts: {enc.conflict_count(solution)}")
+
+    # ---------------- STEP 5: RESUME FROM CHECKPOINT ----------------
+    resume = checkpoint.load() if checkpoint is not None else None
+    if resume and resume.get('engine') != engine:
+        yield ("LOG", f"Ignoring checkpoint of engine {resume.get('engine')}")
+        resume = None
+    resumed_steps = 0
+    curve_prefix = [] # fitness curve of the runs before the resume
+    if resume:
+        RunCheckpoint.restore_rng(resume, rng)
+        # Saved positions override DSATUR; sessions the checkpoint does not know keep theirs
+        for sid, day, slot in resume['assignment']:
+            i = enc.sessions.get(sid)
+            if i is not None and day in grid.day_index and slot in grid.slot_index:
+                solution[i] = grid.index(day, slot)
+        state, forced = problem.repair(solution, rng)
+        solution = state.position.copy()
+        resumed_steps = resume['steps']
+        curve_prefix = list(resume['fitness_curve'])
+        deadline.restore(0, resume['elapsed'])
+        yield ("LOG", f"Resuming from checkpoint: {resumed_steps} steps, {resume['elapsed']:.0f}s done, "
+                      f"best {resume['best_score']} ({forced} sessions re-placed)")
+
+    saved_curve = list(curve_prefix)
+
+    def save_checkpoint(position, score, steps):
+        if checkpoint is None or not checkpoint.due() or score == float('-inf'):
+            return None
+        saved_curve.append(score)
+        rows = [(enc.session_data[i]["id"],) + grid.decode(t)
+                for i, t in enumerate(position.tolist()) if t != UNPLACED]
+        checkpoint.save(engine, steps, deadline.elapsed, score, saved_curve, rows, rng)
+        return f"Checkpoint saved at step {steps} (best {score})"
 
     # ---------------- STEP 6: GA OPTIMIZATION ----------------
-    yield ("LOG", "Running Genetic Algorithm Loop...")
-    best_assignment = assignment
-    best_score = fitness(best_assignment)
+    # Delta scoring: only the batch-days touched by a move are rescored
+    scorer = problem.new_scorer(solution)
+    best_score = scorer.score
     yield ("LOG", f"Initial Fitness: {best_score}")
     
     fitness_curve = [best_score]
 
-    ITERATIONS = 1000 # Tuned down slightly for web response
-    
-    for i in range(ITERATIONS):
-        if not best_assignment: break # Safety
-        
-        candidate = copy.deepcopy(best_assignment)
-        
-        node = random.choice(list(candidate.keys()))
-        s = G.nodes[node]["data"]
-        d = random.choice(DAYS)
-        
-        if s["pref_session"] == 'FN':
-            sl = random.choice(list(FN_SLOTS))
-        elif s["pref_session"] == 'AN':
-            sl = random.choice(list(AN_SLOTS))
+    if engine == "population":
+        yield ("LOG", "Running Population GA...")
+        generations = options.get("generations", None if anytime else 30)
+        ga = PopulationGA(problem,
+                          population_size=options.get("population_size", 16),
+                          generations=generations,
+                          crossover=options.get("crossover", "batch"),
+                          workers=options.get("workers"),
+                          seed=rng.getrandbits(32))
+        budget = deadline.child(stagnation=stagnation, max_steps=generations).restore(resumed_steps)
+        best_solution, best_score, fitness_curve = yield from _with_checkpoints(ga.run(solution, budget), save_checkpoint)
+        best_assignment = {node: t for node, t in enumerate(best_solution.tolist()) if t != UNPLACED}
+        final_position = best_solution
+    elif engine == "islands":
+        yield ("LOG", "Running Island Model...")
+        epochs = options.get("epochs", None if anytime else 20)
+        if epochs and resumed_steps:
+            epochs = max(1, epochs - resumed_steps)
+        islands = IslandModel(problem,
+                              islands=options.get("islands"),
+                              epochs=epochs,
+                              migration_interval=options.get("migration_interval", 250),
+                              strategy=options.get("strategy", "hill_climb"),
+                              seed=rng.getrandbits(32))
+        budget = deadline.child(stagnation=stagnation)
+        def save_island_checkpoint(position, score, epochs_done):
+            return save_checkpoint(position, score, resumed_steps + epochs_done)
+        best_solution, best_score, fitness_curve = yield from _with_checkpoints(islands.run(solution, budget),
+                                                                                save_island_checkpoint)
+        best_assignment = {node: t for node, t in enumerate(best_solution.tolist()) if t != UNPLACED}
+        final_position = best_solution
+    else:
+        # Single-candidate local search: hill_climb, annealing or tabu
+        iterations = options.get("iterations", None if anytime else ITERATIONS)
+        params = {k: v for k, v in options.items() if k not in ("time_limit", "stagnation")}
+        budget = deadline.child(stagnation=stagnation, max_steps=iterations).restore(resumed_steps)
+        decomposition = Decomposition(problem, sessions, ROOM_POOLS, external_rooms) if options.get("decompose", True) else None
+        if decomposition and decomposition.count > 1:
+            # Independent components (rooms shared out between them) run in parallel
+            yield ("LOG", f"Decomposition: {decomposition.summary()}")
+            yield ("LOG", f"Running Local Search ({engine}) per component...")
+            merged, curve, steps = yield from _with_checkpoints(
+                decomposition.run(solution, engine, params, budget,
+                                  workers=options.get("workers"), seed=rng.getrandbits(32)),
+                save_checkpoint)
+            state, forced = problem.repair(merged, rng)
+            best_solution = state.position.copy()
+            best_score = problem.new_scorer(best_solution).score
+            # Batches without sessions score the same everywhere; shift the summed curve onto the full score
+            fitness_curve = [x + best_score - curve[-1] for x in curve]
+            if forced:
+                yield ("LOG", f"Merge: {forced} sessions re-placed")
+            msg = save_checkpoint(best_solution, best_score, steps)
+            if msg:
+                yield ("LOG", msg)
         else:
-            sl = random.choice(SLOTS)
-        
-        # Constraints check for mutation
-        # if s["pref_session"] == 'FN' and sl not in FN_SLOTS: continue (Softened)
-        # if s["pref_session"] == 'AN' and sl not in AN_SLOTS: continue (Softened)
-        if s["type"] == "lab" and sl >= 8: continue
-        
-        # Mutation: Respect Global Conflicts
-        if sl in occupied_faculty[s["faculty"]][d]: continue
-        if s["type"] == "lab" and (sl+1) in occupied_faculty[s["faculty"]][d]: continue
-        
-        if s["type"] != "lab":
-             room = BATCH_ROOMS.get(s["batch_id"], "Unknown")
-             if sl in occupied_rooms[room][d]: continue
-        
-        candidate[node] = (d, sl)
-        
-        if hard_ok(candidate):
-            score = fitness(candidate)
-            if score > best_score:
-                best_score = score
-                best_assignment = candidate
-                yield ("LOG", f"Iter {i}: New Best Score {best_score}")
-        
-        # Heartbeat to keep connection alive
-        if i % 50 == 0:
-            yield ("LOG", f"STATUS:WORKING:ITER:{i}")
-            fitness_curve.append(best_score)
+            if decomposition and decomposition.linked:
+                yield ("LOG", "Decomposition: components compete for scarce rooms, solving them together")
+            strategy = make_strategy(engine, problem, state, scorer, rng,
+                                     **dict(params, iterations=iterations))
+            yield ("LOG", f"Running Local Search ({strategy.name})...")
+            best_solution, best_score, fitness_curve = yield from _with_checkpoints(strategy.run(iterations, budget=budget), save_checkpoint)
+        best_assignment = {node: t for node, t in enumerate(best_solution.tolist()) if t != UNPLACED}
+        final_position = best_solution
             
+    fitness_curve = curve_prefix + list(fitness_curve)
     yield ("LOG", f"Final Fitness: {best_score}")
+    yield ("LOG", f"Final Conflicts: {enc.conflict_count(final_position)}")
+
+    # ---------------- ROOM ASSIGNMENT ----------------
+    # Per-timeslot matching of the scheduled sessions to eligible rooms (type, capacity)
+    room_of = rooms.allocate(final_position, enc.length)
+    unroomed = sum(1 for node in best_assignment if room_of[node] == "TBD" and rooms.pool[node] >= 0)
+    yield ("LOG", f"Room Assignment: {len(best_assignment) - unroomed} sessions roomed, {unroomed} without a free room")
 
     # ---------------- FORMAT OUTPUT ----------------
     # Convert to schema: { batch_id: { day: { slot: "course" } } }
@@ -514,12 +555,13 @@ def run_custom_ga(db, batch_ids, log_callback=None):
         final_timetables[b['_id']] = {d: {} for d in DAYS}
 
     # Populate
-    for node, (day, slot) in best_assignment.items():
-        s = G.nodes[node]["data"]
+    for node, t in best_assignment.items():
+        s = enc.session_data[node]
+        day, slot = grid.decode(t)
         b_id = ObjectId(s["batch_id"])
         
         # Room assignment
-        room = BATCH_ROOMS.get(s["batch_id"], "TBD")
+        room = room_of[node]
         
         # entry_text = f"{s['course']} ({s['faculty']}) [{room}]"
         
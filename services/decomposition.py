@@ -0,0 +1,207 @@
+import os
+import time
+import queue
+import random
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, wait
+from services.ga_config import POOL_START_METHOD
+from services.local_search import make_strategy, stats_summary
+from services.room_allocation import RoomPools, share_rooms
+from services.search_budget import SearchBudget
+
+# A room size class whose sessions need more than this share of its room-slots
+# is not split between components: its sessions' components are solved together
+TIGHT_ROOMS = 0.5
+
+# Seconds between the best-so-far reports a component sends back while it runs
+REPORT_INTERVAL = 1.0
+
+
+def _link(labels, groups):
+    """
+    Merges the components of `labels` that share a member of any of `groups`
+    (index arrays); returns (labels, count) renumbered in order of first node.
+    """
+    parent = list(range(int(labels.max()) + 1 if len(labels) else 0))
+
+    def find(k):
+        while parent[k] != k:
+            parent[k] = parent[parent[k]]
+            k = parent[k]
+        return k
+
+    for members in groups:
+        roots = {find(k) for k in labels[members].tolist()}
+        first = min(roots)
+        for r in roots:
+            parent[r] = first
+    renumber = {}
+    linked = np.array([renumber.setdefault(find(k), len(renumber)) for k in labels.tolist()], dtype=np.int32)
+    return linked, len(renumber)
+
+
+# Worker processes: queue for the reports of running components, installed once per worker
+_reports = None
+
+def _init_worker(reports):
+    global _reports
+    _reports = reports
+    # Reports are best effort: a worker exiting must not wait for the parent to read them
+    reports.cancel_join_thread()
+
+
+def _solve_component(args):
+    """
+    Worker: runs a local-search strategy on one component (a GAProblem over
+    its sessions only) and returns (k, best_solution, best_score, curve, forced,
+    steps, move stats, stop reason).
+    While it runs, its best so far goes to the parent's queue every
+    REPORT_INTERVAL seconds as (k, best_solution, best_score, steps, fraction).
+    """
+    k, problem, initial, engine, params, seed, time_limit, deadline, stagnation, max_steps, steps_done = args
+    if deadline is not None:
+        # Components queued behind others must still end by the run's deadline
+        time_limit = max(0.0, min(time_limit, deadline - time.time()))
+    rng = random.Random(seed)
+    state, forced = problem.repair(initial, rng)
+    scorer = problem.new_scorer(state.position)
+    strategy = make_strategy(engine, problem, state, scorer, rng, **dict(params, iterations=max_steps))
+    budget = SearchBudget(time_limit=time_limit, stagnation=stagnation, max_steps=max_steps).restore(steps_done)
+
+    # Generator events cannot cross the process boundary; the checkpoints are sampled onto the queue
+    events = strategy.run(max_steps, budget=budget)
+    reported = time.monotonic()
+    while True:
+        try:
+            event = next(events)
+        except StopIteration as stop:
+            best_solution, best_score, curve = stop.value
+            break
+        if event[0] == "CHECKPOINT" and _reports is not None and time.monotonic() - reported >= REPORT_INTERVAL:
+            reported = time.monotonic()
+            position, score, steps = event[1]
+            _reports.put((k, position, score, steps, budget.fraction()))
+    return k, best_solution, best_score, curve, forced, budget.steps, strategy.stats, budget.reason()
+
+
+class Decomposition:
+    """
+    Splits a run into independent components and solves them in parallel.
+
+    Two sessions interact only through a shared batch, a shared teacher or the
+    rooms, so the connected components of the conflict graph (batch and
+    faculty cliques) can be searched apart once the rooms are shared out
+    between them (see share_rooms). Dealing rooms out up front costs little
+    while they are plentiful but boxes components in when they are scarce,
+    so components competing for a tight room size class (TIGHT_ROOMS) are
+    merged and search those rooms together. Each component becomes its own
+    GAProblem, runs the local-search strategy in a worker process, and the
+    best solutions are merged back into one assignment. The fitness is a sum of
+    per-batch terms, so the merged score is the sum of the component scores.
+    """
+
+    def __init__(self, problem, sessions, pool_rooms, external_rooms=None):
+        self.problem = problem
+        labels, count = problem.conflicts.components()
+        self.labels, self.count = _link(labels, problem.rooms.contended(problem.enc.length, TIGHT_ROOMS))
+        self.linked = count - self.count # components merged over shared scarce rooms
+        self.parts = [np.flatnonzero(self.labels == k) for k in range(self.count)]
+        shares = share_rooms(problem.enc.grid, pool_rooms, sessions, self.labels.tolist(), self.count, external_rooms)
+        self.problems = [
+            problem.subproblem(idx, RoomPools(problem.enc.grid, pool_rooms, [sessions[i] for i in idx], share))
+            for idx, share in zip(self.parts, shares)
+        ]
+
+    def summary(self):
+        sizes = sorted((len(idx) for idx in self.parts), reverse=True)
+        batches = [len(p.enc.batches) for p in self.problems]
+        linked = f", {self.linked} merged over scarce rooms" if self.linked else ""
+        return f"{self.count} independent components ({sum(batches)} batches, sessions per component: {sizes}{linked})"
+
+    def run(self, initial, engine, params, budget, workers=None, seed=None):
+        """
+        Generator: yields ("LOG", msg) / ("PROGRESS", fraction) /
+        ("CHECKPOINT", (merged_solution, score, steps)) while the components
+        run, from the best-so-far reports of their workers, and returns
+        (merged_solution, fitness_curve, steps).
+        `budget` (a SearchBudget) gives the time limit, stagnation and step
+        limits each component runs under.
+        """
+        rng = random.Random(seed)
+        workers = min(workers or os.cpu_count() or 1, self.count)
+        # Biggest components first so the pool is not left waiting on one at the end
+        order = sorted(range(self.count), key=lambda k: -len(self.parts[k]))
+        remaining = budget.remaining()
+        deadline = time.time() + remaining if remaining is not None else None
+        total = sum(len(idx) for idx in self.parts)
+
+        def time_share(k):
+            # With fewer workers than components the time is split by component size
+            if remaining is None or workers >= self.count:
+                return remaining
+            return remaining * min(1.0, workers * len(self.parts[k]) / total)
+
+        tasks = [(k, self.problems[k], initial[self.parts[k]], engine, params, rng.getrandbits(32),
+                  time_share(k), deadline, budget.stagnation, budget.max_steps, budget.steps) for k in order]
+
+        yield ("LOG", f"Decomposition: solving {self.count} components on {workers} workers")
+        merged = np.array(initial, copy=True)
+        curves = []
+        steps = budget.steps
+        fraction = [0.0] * self.count
+        stats = {} # move type -> [proposed, feasible, accepted], summed over the components
+        reasons = {} # stop reason -> components that stopped for it
+        finished = set()
+        ctx = mp.get_context(POOL_START_METHOD)
+        reports = ctx.Queue()
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                   initializer=_init_worker, initargs=(reports,))
+        try:
+            pending = {pool.submit(_solve_component, task) for task in tasks}
+            while pending:
+                done, pending = wait(pending, timeout=REPORT_INTERVAL)
+                reported = False
+                while True:
+                    try:
+                        k, best_solution, _, comp_steps, frac = reports.get_nowait()
+                    except queue.Empty:
+                        break
+                    if k in finished: # a late report; the final result is already merged
+                        continue
+                    merged[self.parts[k]] = best_solution
+                    steps = max(steps, comp_steps)
+                    fraction[k] = frac
+                    reported = True
+                for future in done:
+                    k, best_solution, best_score, curve, forced, comp_steps, comp_stats, reason = future.result()
+                    finished.add(k)
+                    for kind, counts in comp_stats.items():
+                        stats[kind] = [a + b for a, b in zip(stats.get(kind, [0, 0, 0]), counts)]
+                    reasons[reason] = reasons.get(reason, 0) + 1
+                    merged[self.parts[k]] = best_solution
+                    curves.append(curve)
+                    steps = max(steps, comp_steps)
+                    fraction[k] = 1.0
+                    reported = True
+                    yield ("LOG", f"Component {k} ({len(self.parts[k])} sessions): best {best_score} "
+                                  f"after {comp_steps} steps ({reason})" + (f", {forced} forced" if forced else ""))
+                if reported:
+                    yield ("PROGRESS", sum(fraction) / self.count)
+                    # Each component keeps to its own rooms, so the merged best so far is a valid resume point
+                    if pending:
+                        yield ("CHECKPOINT", (merged.copy(), self.problem.new_scorer(merged).score, steps))
+        finally:
+            # Closed early (the request was dropped): don't wait for the running components
+            pool.shutdown(wait=False, cancel_futures=True)
+            reports.close()
+
+        # The same run summary a single search logs, over all the components
+        yield ("LOG", f"Stopped after {steps} steps: " + ", ".join(
+            f"{reason} ({n} component{'s' if n > 1 else ''})" for reason, n in reasons.items()))
+        yield ("LOG", stats_summary(stats))
+
+        # Component curves share the heartbeat, so they add up point by point
+        length = max(len(c) for c in curves)
+        curve = [sum(c[min(j, len(c) - 1)] for c in curves) for j in range(length)]
+        return merged, curve, steps
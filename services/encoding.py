@@ -0,0 +1,120 @@
+import numpy as np
+
+UNPLACED = -1
+
+
+class Interner:
+    """Stable name -> integer index mapping (first seen gets the next index)."""
+
+    def __init__(self, names=()):
+        self.index = {}
+        self.names = []
+        for name in names:
+            self.add(name)
+
+    def add(self, name):
+        idx = self.index.get(name)
+        if idx is None:
+            idx = len(self.names)
+            self.index[name] = idx
+            self.names.append(name)
+        return idx
+
+    def get(self, name, default=None):
+        return self.index.get(name, default)
+
+    def __getitem__(self, name):
+        return self.index[name]
+
+    def __contains__(self, name):
+        return name in self.index
+
+    def __len__(self):
+        return len(self.names)
+
+
+class TimeGrid:
+    """
+    Flattens (day, slot) into a single timeslot index t = day_idx * n_slots + slot_idx,
+    so a week is one contiguous axis of len(days) * len(slots) cells.
+    """
+
+    def __init__(self, days, slots):
+        self.days = list(days)
+        self.slots = list(slots)
+        self.n_days = len(self.days)
+        self.n_slots = len(self.slots)
+        self.size = self.n_days * self.n_slots
+        self.day_index = {d: i for i, d in enumerate(self.days)}
+        self.slot_index = {s: i for i, s in enumerate(self.slots)}
+
+    def index(self, day, slot):
+        return self.day_index[day] * self.n_slots + self.slot_index[slot]
+
+    def decode(self, t):
+        return self.days[t // self.n_slots], self.slots[t % self.n_slots]
+
+
+class SessionEncoding:
+    """
+    Integer-interned view of the custom GA sessions.
+
+    Sessions, batches and faculty are mapped to dense indices and the
+    per-session attributes are stored as NumPy arrays (rooms are not part of
+    the search; see RoomPools). A solution is a single
+    int16 array (session -> timeslot index, UNPLACED if not placed) instead of
+    a dict of string ids to (day, slot) tuples.
+    """
+
+    def __init__(self, sessions, grid, batch_ids=()):
+        self.grid = grid
+        self.session_data = list(sessions)
+        self.sessions = Interner(s["id"] for s in self.session_data)
+        self.batches = Interner(batch_ids)
+        self.faculty = Interner()
+
+        n = len(self.session_data)
+        self.batch = np.empty(n, dtype=np.int32)
+        self.faculty_of = np.empty(n, dtype=np.int32)
+        self.length = np.ones(n, dtype=np.int8)         # labs take 2 consecutive slots
+        self.is_lab = np.zeros(n, dtype=bool)
+
+        for i, s in enumerate(self.session_data):
+            self.batch[i] = self.batches.add(s["batch_id"])
+            self.faculty_of[i] = self.faculty.add(s["faculty"])
+            if s["type"] == "lab":
+                self.length[i] = 2
+                self.is_lab[i] = True
+
+    def __len__(self):
+        return len(self.session_data)
+
+    # ---------------- VECTORISED COUNTS ----------------
+    def occupancy(self, solution, owner, n_owners, mask=None):
+        """
+        Counts matrix (n_owners x timeslots) of how many sessions each owner has
+        in each cell, with labs covering both of their slots.
+        """
+        occ = np.zeros((n_owners, self.grid.size), dtype=np.int16)
+        placed = solution != UNPLACED
+        if mask is not None:
+            placed &= mask
+        t = solution[placed].astype(np.int64)
+        o = owner[placed]
+        np.add.at(occ, (o, t), 1)
+        second = self.is_lab[placed]
+        np.add.at(occ, (o[second], t[second] + 1), 1)
+        return occ
+
+    def faculty_occupancy(self, solution):
+        return self.occupancy(solution, self.faculty_of, len(self.faculty))
+
+    def batch_occupancy(self, solution):
+        return self.occupancy(solution, self.batch, len(self.batches))
+
+    def conflict_count(self, solution):
+        """Number of double-booked faculty/batch cells across the whole week."""
+        total = 0
+        for occ in (self.faculty_occupancy(solution), self.batch_occupancy(solution)):
+            total += int(np.maximum(occ - 1, 0).sum())
+        return total
@@ -0,0 +1,90 @@
+import networkx as nx
+
+# Cost of a slot beyond a teacher's weekly capacity: always worse than any
+# amount of balancing, but keeps the flow feasible when capacity runs short.
+OVERLOAD_COST = 10000
+
+
+def _load_cost(load, capacity):
+    # Matches the band costs of the flow network: slot k (1-based) costs k, overload costs extra
+    within = min(load, capacity)
+    return within * (within + 1) // 2 + max(0, load - capacity) * OVERLOAD_COST
+
+
+def assign_faculty(demands, qualified, capacity, fixed=None):
+    """
+    Load-balancing faculty pre-assignment as a min-cost flow.
+
+    demands:   list of (key, load) - e.g. ((batch_id, code), weekly slots)
+    qualified: key -> list of qualified faculty names
+    capacity:  faculty name -> weekly slots they can still teach
+               (max_day per day minus unavailable/already-booked slots)
+    fixed:     optional key -> faculty name kept as is (e.g. from a warm start);
+               their load is taken off the teacher's capacity first
+
+    Every unit of load flows course -> qualified teacher -> sink. A teacher's
+    k-th slot costs k, so cheap flows spread the load evenly, and slots past
+    their capacity cost OVERLOAD_COST. The flow can split a course across
+    teachers, so each course then takes the teacher carrying most of its
+    flow, and a reassignment pass settles the rounding.
+    Returns key -> faculty name; keys without qualified faculty are left out.
+    """
+    fixed = dict(fixed or {})
+    capacity = dict(capacity)
+    for key, load in demands:
+        if key in fixed:
+            capacity[fixed[key]] = max(0, capacity.get(fixed[key], 0) - load)
+    demands = [(key, load) for key, load in demands if qualified.get(key) and key not in fixed]
+    if not demands:
+        return fixed
+    teachers = sorted({f for key, _ in demands for f in qualified[key]})
+    total = sum(load for _, load in demands)
+
+    G = nx.DiGraph()
+    G.add_node("sink", demand=total)
+    for k, (key, load) in enumerate(demands):
+        G.add_node(("course", k), demand=-load)
+        for f in qualified[key]:
+            G.add_edge(("course", k), ("fac", f), capacity=load, weight=0)
+    for f in teachers:
+        cap = max(0, capacity.get(f, 0))
+        for band in range(1, cap + 1):
+            G.add_edge(("fac", f), ("band", f, band), capacity=1, weight=band)
+            G.add_edge(("band", f, band), "sink", capacity=1, weight=0)
+        G.add_edge(("fac", f), "sink", capacity=total, weight=OVERLOAD_COST)
+
+    flow = nx.min_cost_flow(G)
+
+    # Round: each course goes to the teacher carrying most of its flow
+    assignment = {}
+    load = {f: 0 for f in teachers}
+    for k, (key, demand) in enumerate(demands):
+        out = flow[("course", k)]
+        f = max(qualified[key], key=lambda f: out.get(("fac", f), 0))
+        assignment[key] = f
+        load[f] += demand
+
+    # Settle the rounding: move courses (largest first) while it lowers the total cost
+    order = sorted(range(len(demands)), key=lambda k: -demands[k][1])
+    improved = True
+    while improved:
+        improved = False
+        for k in order:
+            key, demand = demands[k]
+            cur = assignment[key]
+            cap = capacity.get
+            base = _load_cost(load[cur], cap(cur, 0))
+            for f in qualified[key]:
+                if f == cur:
+                    continue
+                delta = (_load_cost(load[cur] - demand, cap(cur, 0)) - base
+                         + _load_cost(load[f] + demand, cap(f, 0)) - _load_cost(load[f], cap(f, 0)))
+                if delta < 0:
+                    load[cur] -= demand
+                    load[f] += demand
+                    assignment[key] = cur = f
+                    base = _load_cost(load[cur], cap(cur, 0))
+                    improved = True
+
+    assignment.update(fixed)
+    return assignment
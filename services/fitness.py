@@ -1,3 +1,24 @@
+import numpy as np
+from functools import lru_cache
+
+_SLOT_BITS = {} # slot key ("1", 1, ...) -> its bit, so the day masks skip int() parsing
+
+
+@lru_cache(maxsize=None)
+def day_score(mask):
+    """
+    Empty-day, gap and density score of one day from its occupancy bitmask
+    (bit s = slot number s occupied). Cached, so each pattern is scored once
+    and every other batch-day with the same pattern is a lookup.
+    """
+    if not mask:
+        return -10
+    n = bin(mask).count("1")
+    first = (mask & -mask).bit_length() - 1
+    gaps = (mask.bit_length() - first) - n
+    return n * 2 - gaps * 4
+
+
 def compute_fitness(timetables):
     """
     Evaluate the quality of a set of timetables.
@@ -7,24 +28,20 @@ def compute_fitness(timetables):
 
     for batch_id, tt in timetables.items():
         for day, slots in tt.items():
-            # Get occupied slots as integers
-            occupied = sorted(int(s) for s,v in slots.items() if v)
+            # Occupied slots as a bitmask
+            mask = 0
+            for s, v in slots.items():
+                if v:
+                    bit = _SLOT_BITS.get(s)
+                    if bit is None:
+                        bit = _SLOT_BITS[s] = 1 << int(s)
+                    mask |= bit
 
             # 1. Penalize Empty Days (We want balanced load, or at least active days)
             # Actually, standard logic often prefers compact weeks, but let's assume we want spread.
-            if not occupied:
-                score -= 10
-                continue
-
-            # 2. Penalize Gaps
-            # Ideally students shouldn't have > 1 hour gap.
-            for i in range(1, len(occupied)):
-                gap = occupied[i] - occupied[i-1] - 1
-                if gap > 0:
-                    score -= gap * 4 # Heavy penalty per gap hour
-
-            # 3. Reward Compactness (Density)
-            score += len(occupied) * 2
+            # 2. Penalize Gaps (-4 per gap hour; ideally students shouldn't have > 1 hour gap)
+            # 3. Reward Compactness (Density, +2 per occupied slot)
+            score += day_score(mask)
 
         # 4. Check Course Spread (Distribution across days)
         # Avoid same course 3 times on Mon, Tue, Wed and then nothing.
@@ -49,3 +66,54 @@ def compute_fitness(timetables):
             pass
 
     return score
+
+
+def occupancy_tensor(population):
+    """
+    Stacks a population of timetables into a boolean occupancy tensor of
+    shape (population, batch, day, slot), plus the slot numbers of the last
+    axis. All individuals must share the batch/day/slot layout of the first
+    one (true for a GA population, which all come from the same scheduler).
+    Children share most day dicts with their parents (copy_on_write_day), so
+    each distinct day dict is converted once per call.
+    """
+    if not population or not population[0]:
+        return np.zeros((len(population), 0, 0, 0), dtype=bool), np.zeros(0, dtype=np.int64)
+    first = population[0]
+    batches = list(first)
+    days = list(first[batches[0]])
+    slots = sorted(first[batches[0]][days[0]], key=int)
+
+    rows = []
+    seen = {} # id(day dict) -> its occupancy row; the dicts stay alive for the whole call
+    for tt in population:
+        for b in batches:
+            week = tt[b]
+            for day in days:
+                day_slots = week[day]
+                row = seen.get(id(day_slots))
+                if row is None:
+                    row = seen[id(day_slots)] = [bool(day_slots.get(sl)) for sl in slots]
+                rows.append(row)
+
+    occupancy = np.array(rows, dtype=bool).reshape(len(population), len(batches), len(days), len(slots))
+    return occupancy, np.array([int(sl) for sl in slots], dtype=np.int64)
+
+
+def compute_population_fitness(occupancy, slot_numbers):
+    """
+    compute_fitness for a whole population at once, from occupancy_tensor():
+    the empty-day, gap and density terms of every batch-day as NumPy
+    reductions over the slot axis. Returns one score per individual.
+    """
+    P = occupancy.shape[0]
+    if not occupancy.size:
+        return np.zeros(P, dtype=np.int64)
+    S = occupancy.shape[-1]
+    n = occupancy.sum(axis=-1)
+    first = slot_numbers[occupancy.argmax(axis=-1)]
+    last = slot_numbers[S - 1 - occupancy[..., ::-1].argmax(axis=-1)]
+    gaps = (last - first + 1) - n
+    # Same terms as day_score: -10 for an empty day, +2 per slot, -4 per gap hour
+    days = np.where(n > 0, n * 2 - gaps * 4, -10)
+    return days.reshape(P, -1).sum(axis=1)
@@ -0,0 +1,11 @@
+# ---------------- CONFIG ----------------
+# Shared time grid for the custom GA pipeline and its scoring/constraint engines.
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri"]
+SLOTS = list(range(1, 9))   # slot 9 blocked
+FN_SLOTS = {1, 2, 3, 4}
+AN_SLOTS = {5, 6, 7, 8}
+
+# Start method for the engine pools and the process workers. They are started from
+# the (multithreaded) web process, where fork can copy a lock another thread holds;
+# forkserver children come from a clean single-threaded server instead.
+POOL_START_METHOD = "forkserver"
@@ -1,9 +1,12 @@
 import random
-from services.fitness import compute_fitness
+from services.fitness import compute_population_fitness, occupancy_tensor
 from services.mutations import swap_two_theory_sessions
+from services.search_budget import SearchBudget
+
+POPULATION_SIZE = 8
 
 class GeneticOptimizer:
-    def __init__(self, base_scheduler, population_size=8, generations=10):
+    def __init__(self, base_scheduler, population_size=POPULATION_SIZE, generations=10):
         self.base_scheduler = base_scheduler
         self.population_size = population_size
         self.generations = generations
@@ -19,27 +22,40 @@ class GeneticOptimizer:
             population.append(tt)
         return population
 
-    def run(self, log_fn=None):
-        if log_fn: log_fn(f"Initializing Population ({self.population_size})...")
-        population = self.generate_initial_population()
+    def run(self, log_fn=None, budget=None, population=None):
+        # budget: optional SearchBudget counting generations; default is a fixed `generations`
+        # population: optional initial timetables (e.g. allocated on a process pool), else built here
+        budget = budget or SearchBudget(max_steps=self.generations)
+        if population is None:
+            if log_fn: log_fn(f"Initializing Population ({self.population_size})...")
+            population = self.generate_initial_population()
 
         best_solution = None
         best_score = float('-inf')
 
-        for gen in range(1, self.generations + 1):
-            # Evaluate
-            scored = [(compute_fitness(p), p) for p in population]
+        # The first population is always scored, so even a budget that is already
+        # spent (a late retry) returns its best member instead of nothing
+        gen = 0
+        while True:
+            gen += 1
+            # Evaluate (whole population in one batched call)
+            scores = compute_population_fitness(*occupancy_tensor(population))
+            scored = list(zip(scores.tolist(), population))
             scored.sort(key=lambda x: x[0], reverse=True)
 
             score, solution = scored[0]
             self.fitness_history.append(score)
 
-            if score > best_score:
+            improved = score > best_score
+            if improved:
                 best_score = score
                 best_solution = solution
+            budget.step(improved)
 
             if log_fn:
                 log_fn(f"GA Gen {gen} | Best Fitness = {score}")
+            if budget.exhausted():
+                break
 
             # Elitism (Keep top 30%)
             keep_n = max(1, int(self.population_size * 0.3))
@@ -56,4 +72,5 @@ class GeneticOptimizer:
 
             population = new_population
 
+        if log_fn: log_fn(f"GA stopped after {gen} generations: {budget.reason()}")
         return best_solution, self.fitness_history
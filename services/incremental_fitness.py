@@ -0,0 +1,228 @@
+import numpy as np
+from functools import lru_cache
+from services.encoding import UNPLACED
+from services.ga_config import FN_SLOTS, AN_SLOTS
+
+# All penalties are kept in units of 1/5 so the balance term (which divides the
+# weekly load by 5 days) stays an exact integer and cached totals never drift.
+SCALE = 5
+
+
+@lru_cache(maxsize=None)
+def day_pattern_score(mask, labs):
+    """
+    Score of a batch-day that depends only on its occupancy pattern (bit k =
+    k-th slot of the day) and its number of labs (capped at 2): empty day,
+    gaps, more than 5 slots and more than one lab. There are only
+    2^n_slots x 3 keys, so after warm-up this is a table lookup shared by
+    every batch, day and scorer in the process.
+    """
+    score = 0
+    if not mask:
+        score -= 15 * SCALE
+    else:
+        n = popcount(mask)
+        first = (mask & -mask).bit_length() - 1
+        gaps = (mask.bit_length() - first) - n
+        score -= gaps * 5 * SCALE
+        if n > 5:
+            score -= (n - 5) * 10 * SCALE
+    if labs > 1:
+        score -= 20 * SCALE
+    return score
+
+
+@lru_cache(maxsize=1 << 16)
+def popcount(mask):
+    return bin(mask).count("1")
+
+
+class IncrementalFitness:
+    """
+    Delta scoring engine for the custom GA loop.
+
+    Keeps the fitness of a solution broken down into per-batch/per-day
+    contributions plus a per-session preference term. Moving one session from
+    t1 to t2 only rescores the (at most two) batch-days it touches, instead of
+    rebuilding every batch's week from scratch.
+
+    Scores are identical to the full evaluation for every solution without
+    batch clashes (any result of the hard-constrained search):
+      - Session preference (FN/AN) violated: -20
+      - Empty day: -15
+      - Gaps inside a day: -5 per empty slot
+      - More than 5 slots in a day: -10 per extra slot
+      - Imbalance vs the batch's weekly average: -2 per slot of difference
+      - Theory after slot 4: -2
+      - More than one lab in a day: -20
+
+    A batch-day without clashes is scored from its occupancy bitmask through
+    the shared day_pattern_score table plus the balance and late-theory terms;
+    only clashing days are walked cell by cell. On such a day (a forced
+    placement) a lab and a theory session can start in the same cell; the
+    full evaluation then applies the late-theory penalty according to
+    whichever of the two it visited last, while this scorer always applies
+    it, so the two can differ by that term.
+
+    With an `anchor` (warm start from a stored timetable) every session that
+    is not at its anchored timeslot also costs `deviation_penalty`, which
+    keeps re-optimised timetables close to the old plan.
+    """
+
+    def __init__(self, enc, solution, anchor=None, deviation_penalty=0):
+        # enc: SessionEncoding, solution: session -> timeslot array
+        # anchor: optional session -> previous timeslot array (UNPLACED = new session)
+        self.enc = enc
+        grid = enc.grid
+        self.n_slots = grid.n_slots
+        self.slot_values = grid.slots
+        self.n_days = grid.n_days
+
+        self._batch = enc.batch.tolist()
+        self._lab = enc.is_lab.tolist()
+        self._pref = [s.get("pref_session") for s in enc.session_data]
+        self._anchor = anchor.tolist() if anchor is not None else [UNPLACED] * len(enc)
+        self.deviation = int(deviation_penalty * SCALE)
+
+        self.position = np.array(solution, dtype=np.int16)
+        B = len(enc.batches)
+
+        # batch x t -> number of sessions covering the cell (labs cover 2)
+        self.occupied = enc.batch_occupancy(self.position).tolist()
+        # batch x t -> number of theory sessions starting in the cell
+        theory = enc.occupancy(self.position, enc.batch, B, mask=~enc.is_lab)
+        self.theory_starts = theory.tolist()
+        # batch x day -> number of labs
+        self.lab_count = [[0] * self.n_days for _ in range(B)]
+        for i, t in enumerate(self.position.tolist()):
+            if t != UNPLACED and self._lab[i]:
+                self.lab_count[self._batch[i]][t // self.n_slots] += 1
+        # batch -> total occupied slots in the week (constant under moves)
+        self.week_load = [sum(row) for row in self.occupied]
+
+        # Bitmask view for the pattern table: bit t set while the count at t is > 0
+        self.day_bits = (1 << self.n_slots) - 1
+        self.occupied_mask = [sum(1 << t for t, c in enumerate(row) if c) for row in self.occupied]
+        # Slots after slot 4, as a slice of the day when they are contiguous (the usual grid)
+        late = [k for k, sl in enumerate(self.slot_values) if sl > 4]
+        self.late_run = (late[0], late[-1] + 1) if late and late == list(range(late[0], late[-1] + 1)) else None
+
+        self.day_score = [[self._score_day(b, d) for d in range(self.n_days)] for b in range(B)]
+        self.pref_score = [self._score_pref(i, t) for i, t in enumerate(self.position.tolist())]
+
+        self.total = sum(sum(row) for row in self.day_score) + sum(self.pref_score)
+
+    @property
+    def score(self):
+        return self.total / SCALE
+
+    # ---------------- SCORING ----------------
+    def _score_pref(self, i, t):
+        # Per-session terms: FN/AN preference and deviation from the anchor
+        if t == UNPLACED:
+            return 0
+        score = 0
+        anchor = self._anchor[i]
+        if anchor != UNPLACED and t != anchor:
+            score -= self.deviation
+        pref = self._pref[i]
+        sl = self.slot_values[t % self.n_slots]
+        if pref == 'FN' and sl not in FN_SLOTS:
+            return score - 20 * SCALE
+        if pref == 'AN' and sl not in AN_SLOTS:
+            return score - 20 * SCALE
+        return score
+
+    def _score_day(self, b, d):
+        start = d * self.n_slots
+        n = sum(self.occupied[b][start:start + self.n_slots])
+        mask = (self.occupied_mask[b] >> start) & self.day_bits
+        if n != popcount(mask) or self.late_run is None:
+            # A clash (forced placement) counts a cell twice: score it cell by cell
+            return self._score_day_cells(b, d)
+
+        score = day_pattern_score(mask, min(self.lab_count[b][d], 2))
+        if n:
+            # abs(n - week_load / 5) * 2, kept exact in 1/5 units
+            score -= abs(n * 5 - self.week_load[b]) * 2
+            # Theory after slot 4 (no clash, so every late cell holds at most one session)
+            lo, hi = self.late_run
+            score -= 2 * SCALE * sum(self.theory_starts[b][start + lo:start + hi])
+        return score
+
+    def _score_day_cells(self, b, d):
+        start = d * self.n_slots
+        cells = self.occupied[b][start:start + self.n_slots]
+        starts = self.theory_starts[b][start:start + self.n_slots]
+        n = sum(cells)
+        score = 0
+
+        if not n:
+            score -= 15 * SCALE
+        else:
+            used = [k for k, c in enumerate(cells) if c]
+            gaps = (used[-1] - used[0] + 1) - n
+            score -= gaps * 5 * SCALE
+
+            if n > 5:
+                score -= (n - 5) * 10 * SCALE
+
+            # abs(n - week_load / 5) * 2, kept exact in 1/5 units
+            score -= abs(n * 5 - self.week_load[b]) * 2
+
+            for k in used:
+                if self.slot_values[k] > 4 and starts[k]:
+                    score -= 2 * SCALE * cells[k]
+
+        if self.lab_count[b][d] > 1:
+            score -= 20 * SCALE
+
+        return score
+
+    # ---------------- MOVES ----------------
+    def _update(self, i, t, sign):
+        b = self._batch[i]
+        occ = self.occupied[b]
+        occ[t] += sign
+        if self._lab[i]:
+            occ[t + 1] += sign
+            self.lab_count[b][t // self.n_slots] += sign
+            cells = 3 << t
+        else:
+            self.theory_starts[b][t] += sign
+            cells = 1 << t
+        # Mirror the touched cells into the mask (bit set while the count is > 0)
+        if sign > 0:
+            self.occupied_mask[b] |= cells
+        else:
+            mask = self.occupied_mask[b] & ~cells
+            if occ[t]:
+                mask |= 1 << t
+            if cells >> t == 3 and occ[t + 1]:
+                mask |= 2 << t
+            self.occupied_mask[b] = mask
+
+    def move(self, i, t):
+        """
+        Moves session `i` to timeslot `t` and returns the new score.
+        Only the source and destination batch-days are rescored.
+        """
+        old = int(self.position[i])
+        if old == t:
+            return self.score
+
+        b = self._batch[i]
+        self._update(i, old, -1)
+        self._update(i, t, 1)
+        self.position[i] = t
+
+        for d in {old // self.n_slots, t // self.n_slots}:
+            new_day = self._score_day(b, d)
+            self.total += new_day - self.day_score[b][d]
+            self.day_score[b][d] = new_day
+
+        new_pref = self._score_pref(i, t)
+        self.total += new_pref - self.pref_score[i]
+        self.pref_score[i] = new_pref
+
+        return self.score
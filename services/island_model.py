@@ -0,0 +1,163 @@
+import os
+import queue
+import random
+import multiprocessing as mp
+from services.ga_config import POOL_START_METHOD
+from services.local_search import random_target, make_strategy
+from services.population_ga import HARD_PENALTY
+from services.search_budget import SearchBudget
+
+
+def _adopt(problem, solution, rng):
+    """Rebuilds state + scorer for a solution (start point or migrant)."""
+    state, forced = problem.repair(solution, rng)
+    scorer = problem.new_scorer(state.position)
+    return state, scorer, forced
+
+
+def _island(island_id, problem, initial, seed, epochs, interval, strategy, inbox, outbox,
+            time_limit=None, stagnation=None):
+    """
+    One island (runs in its own process): a local-search strategy started
+    from its own perturbed copy of the initial assignment. After every
+    `interval` iterations it reports its best to the coordinator and takes
+    in a better migrant if one has arrived. Stops after `epochs` epochs (None =
+    no cap), at `time_limit` seconds or after `stagnation` iterations without
+    a new island best.
+    """
+    budget = SearchBudget(time_limit=time_limit, stagnation=stagnation,
+                          max_steps=epochs * interval if epochs else None)
+    iterations = budget.max_steps or interval
+    rng = random.Random(seed)
+    state, forced = problem.repair(initial, rng)
+    n = len(state.position)
+
+    # Each island starts from a different neighbour of the DSATUR solution
+    if island_id > 0:
+        for _ in range(n):
+            node = rng.randrange(n)
+            t = random_target(problem, rng, node)
+            if t is not None and state.can_move(node, t):
+                state.apply_move(node, t)
+    scorer = problem.new_scorer(state.position)
+    search = make_strategy(strategy, problem, state, scorer, rng, iterations=iterations)
+
+    epoch = 0
+    while not budget.exhausted():
+        for k in range(interval):
+            i = epoch * interval + k
+            improved = search.step(i)
+            search.end_iteration(i)
+            budget.step(improved)
+            if budget.exhausted():
+                break
+
+        fitness = search.best_score - HARD_PENALTY * forced
+        outbox.put(("BEST", island_id, epoch, fitness, search.best_position.copy()))
+
+        # Migration: adopt the best individual sent by the coordinator if it beats ours
+        migrant = None
+        try:
+            while True:
+                migrant = inbox.get_nowait()
+        except queue.Empty:
+            pass
+        if migrant is not None and migrant[0] > fitness:
+            state, scorer, forced = _adopt(problem, migrant[1], rng)
+            search = make_strategy(strategy, problem, state, scorer, rng, iterations=iterations)
+            budget.step(True) # a migrant is progress too
+        epoch += 1
+
+    outbox.put(("DONE", island_id, epoch, search.best_score - HARD_PENALTY * forced, search.best_position.copy()))
+
+
+class IslandModel:
+    """
+    Island-model parallel optimisation: N independent islands in separate
+    processes, each running a local-search strategy seeded differently from
+    the DSATUR assignment. Every
+    `migration_interval` iterations each island reports its best through a
+    shared queue; the coordinator streams the merged progress and sends the
+    overall best back to the other islands as a migrant.
+    """
+
+    def __init__(self, problem, islands=None, epochs=20, migration_interval=250,
+                 strategy="hill_climb", seed=None):
+        self.problem = problem
+        self.strategy = strategy
+        self.islands = islands or os.cpu_count() or 1
+        self.epochs = epochs
+        self.migration_interval = migration_interval
+        self.rng = random.Random(seed)
+        self.fitness_history = []
+
+    def run(self, initial, budget=None):
+        """
+        Generator: yields ("LOG", msg) / ("PROGRESS", fraction) /
+        ("CHECKPOINT", (best_solution, best_score, epochs done)) while running
+        and returns (best_solution, best_score, fitness_history).
+        With a `budget` (SearchBudget) the islands stop at its deadline or after
+        its stagnation limit (in iterations per island); `epochs` may then be None.
+        """
+        budget = budget or SearchBudget()
+        ctx = mp.get_context(POOL_START_METHOD)
+        outbox = ctx.Queue()
+        inboxes = [ctx.Queue() for _ in range(self.islands)]
+        procs = [
+            ctx.Process(target=_island, daemon=True,
+                        args=(k, self.problem, initial, self.rng.getrandbits(32), self.epochs,
+                              self.migration_interval, self.strategy, inboxes[k], outbox,
+                              budget.remaining(), budget.stagnation))
+            for k in range(self.islands)
+        ]
+
+        yield ("LOG", f"Island Model: {self.islands} islands x {self.epochs or 'unlimited'} epochs x {self.migration_interval} iterations ({self.strategy})")
+        for p in procs:
+            p.start()
+
+        best_score, best_solution, best_island = float('-inf'), initial, None
+        reports, total = 0, self.islands * self.epochs if self.epochs else None
+        running = set(range(self.islands))
+
+        try:
+            while running:
+                try:
+                    kind, island, epoch, score, solution = outbox.get(timeout=5)
+                except queue.Empty:
+                    # An island died without reporting (e.g. killed worker)
+                    for k in list(running):
+                        if not procs[k].is_alive():
+                            running.discard(k)
+                            yield ("LOG", f"Island {k} exited unexpectedly")
+                    continue
+
+                if kind == "DONE":
+                    running.discard(island)
+
+                if score > best_score:
+                    best_score, best_solution, best_island = score, solution, island
+                    yield ("LOG", f"Island {island} Epoch {epoch}: New Best Score {best_score}")
+                    # Migrate the new global best to every other island
+                    for k in running:
+                        if k != island:
+                            inboxes[k].put((best_score, best_solution))
+                self.fitness_history.append(best_score)
+
+                # After the update, so the checkpoint includes the report just handled
+                if kind != "DONE":
+                    reports += 1
+                    if reports % self.islands == 0:
+                        yield ("PROGRESS", max(budget.fraction(), reports / total if total else 0))
+                        yield ("CHECKPOINT", (best_solution, best_score, reports // self.islands))
+        finally:
+            # Unread migrants must not block interpreter exit
+            for q in inboxes:
+                q.cancel_join_thread()
+                q.close()
+            for p in procs:
+                p.join(timeout=1)
+                if p.is_alive():
+                    p.terminate()
+
+        yield ("LOG", f"Best island: {best_island}")
+        return best_solution, best_score, self.fitness_history
@@ -0,0 +1,220 @@
+import os
+import uuid
+import atexit
+import socket
+import threading
+import traceback
+import multiprocessing as mp
+from datetime import datetime, timedelta
+from pymongo import ReturnDocument
+from services.ga_config import POOL_START_METHOD
+
+# Log lines kept on a request; older ones are dropped as new ones are appended
+LOG_LIMIT = 1000
+
+
+class GenerationWorker:
+    """
+    Runs queued generation requests outside the HTTP request cycle.
+
+    A worker claims the oldest QUEUED batch_generation_request with one
+    find_one_and_update, so several workers (threads, processes or app
+    instances) never take the same request, runs run_optimization_pipeline
+    on it and writes what the pipeline streams back onto the request:
+      - status: QUEUED -> RUNNING -> COMPLETED / FAILED (+ error)
+      - stage and progress (the pipeline's STATUS: / PROGRESS: lines)
+      - logs (every other line; the last LOG_LIMIT are kept, log_count counts
+        them all) and heartbeat_at
+    Writes are batched to one update per `flush_interval` seconds, which
+    appends only the lines logged since the last one. A RUNNING
+    request whose heartbeat is older than `stale_after` seconds (its worker
+    died with the server) is claimed again and resumes from its checkpoint.
+    The heartbeat comes from its own thread every `heartbeat_interval`
+    seconds, so a long silent phase of the pipeline does not look dead.
+    Every write is conditional on the request still naming this worker: a
+    worker whose request was claimed by another stops running it.
+    """
+
+    def __init__(self, db, name="worker", poll_interval=1.0, flush_interval=1.0, stale_after=300,
+                 heartbeat_interval=30):
+        self.db = db
+        self.name = name
+        self.poll_interval = poll_interval
+        self.flush_interval = flush_interval
+        self.stale_after = stale_after
+        self.heartbeat_interval = min(heartbeat_interval, stale_after / 3)
+
+    def claim(self):
+        """Marks the next runnable request RUNNING for this worker and returns it (or None)."""
+        now = datetime.now()
+        return self.db.batch_generation_request.find_one_and_update(
+            {'$or': [
+                {'status': 'QUEUED'},
+                {'status': 'RUNNING', 'heartbeat_at': {'$lt': now - timedelta(seconds=self.stale_after)}},
+            ]},
+            {'$set': {'status': 'RUNNING', 'worker': self.name, 'claimed_at': now, 'heartbeat_at': now,
+                      'stage': 'CLAIMED', 'progress': 0}},
+            sort=[('created_at', 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    def write(self, req_id, fields, logs=()):
+        """
+        Sets `fields` and appends `logs` on the request if this worker still
+        owns it; returns False once another worker has claimed it (this one
+        looked stale).
+        """
+        update = {'$set': fields}
+        if logs:
+            update['$push'] = {'logs': {'$each': list(logs), '$slice': -LOG_LIMIT}}
+            update['$inc'] = {'log_count': len(logs)}
+        result = self.db.batch_generation_request.update_one({'_id': req_id, 'worker': self.name}, update)
+        return result.matched_count > 0
+
+    def heartbeat(self, req_id, stop, lost):
+        """Thread: refreshes heartbeat_at until `stop` is set; sets `lost` if the claim is gone."""
+        while not stop.wait(self.heartbeat_interval):
+            if not self.write(req_id, {'heartbeat_at': datetime.now()}):
+                lost.set()
+                return
+
+    def run(self, req):
+        """Runs one claimed request to the end, writing its progress as it goes."""
+        from services.optimization_engine import run_optimization_pipeline
+        from services.checkpoint import ClaimLost
+
+        req_id = req['_id']
+        progress = {'stage': 'INITIALIZING', 'progress': 0}
+        logs = [] # lines since the last flush
+        last_flush = datetime.now()
+        lost = threading.Event() # another worker claimed the request
+        stop = threading.Event()
+        beat = threading.Thread(target=self.heartbeat, args=(req_id, stop, lost),
+                                name=f"{self.name}-heartbeat", daemon=True)
+
+        def flush(**extra):
+            # status is left alone here: the pipeline itself marks the request COMPLETED
+            nonlocal last_flush
+            last_flush = datetime.now()
+            if not self.write(req_id, dict(progress, heartbeat_at=last_flush, **extra), logs):
+                lost.set()
+            logs.clear()
+
+        done = False
+        beat.start()
+        try:
+            pipeline = run_optimization_pipeline(self.db, req_id, self.name)
+            for chunk in pipeline:
+                for line in chunk.splitlines():
+                    if line.startswith("PROGRESS:"):
+                        progress['progress'] = int(line.split(':', 1)[1])
+                    elif line.startswith("STATUS:"):
+                        progress['stage'] = line.split(':', 1)[1]
+                    elif line == "DONE":
+                        done = True
+                    elif line.strip():
+                        logs.append(line)
+                if (datetime.now() - last_flush).total_seconds() >= self.flush_interval:
+                    flush()
+                if lost.is_set():
+                    # The new owner resumes from the checkpoint; this run stops writing
+                    pipeline.close()
+                    return
+        except ClaimLost:
+            return # a write of the pipeline found the request taken over
+        except Exception as e:
+            logs.append(f"Worker {self.name}: {e}")
+            logs.append(traceback.format_exc())
+            flush(status='FAILED', error=str(e))
+            return
+        finally:
+            stop.set()
+
+        if done and progress['stage'] == 'COMPLETED':
+            flush()
+        else:
+            flush(status='FAILED', error=f"Pipeline stopped at stage {progress['stage']}")
+
+    def serve(self, stop):
+        """Claims and runs requests until `stop` (a threading/multiprocessing Event) is set."""
+        while not stop.is_set():
+            req = self.claim()
+            if req is None:
+                stop.wait(self.poll_interval)
+                continue
+            self.run(req)
+
+
+def _serve_process(mongo_uri, db_name, name, poll_interval, stop):
+    # Process workers open their own client: a MongoClient must not cross a fork
+    from pymongo import MongoClient
+    db = MongoClient(mongo_uri)[db_name]
+    GenerationWorker(db, name, poll_interval).serve(stop)
+
+
+class GenerationWorkerPool:
+    """
+    `workers` GenerationWorkers running in the background of the web app.
+
+    Threads by default, sharing the app's database handle; the engines keep
+    their problem and random generator per run, so concurrent runs in one
+    process stay apart. With processes=True each worker is a process with
+    its own MongoClient (from `mongo_uri`), so concurrent runs don't share
+    the GIL; they are not daemonic, since the engines start process pools
+    of their own. start() is idempotent (and per process, for servers
+    that fork after import), so the routes that enqueue or watch a run can
+    simply call it.
+    """
+
+    def __init__(self, db, workers=2, processes=False, mongo_uri=None, poll_interval=1.0):
+        if processes and not mongo_uri:
+            raise ValueError("Process workers need mongo_uri to open their own connection")
+        self.db = db
+        self.workers = workers
+        self.processes = processes
+        self.mongo_uri = mongo_uri
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._pid = None
+        self._stop = None
+        self._running = []
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            # Unique across hosts and containers (where every app may run as PID 1)
+            prefix = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}-"
+            if self.processes:
+                ctx = mp.get_context(POOL_START_METHOD)
+                self._stop = ctx.Event()
+                self._running = [
+                    ctx.Process(target=_serve_process, name=f"generation-{k}",
+                                args=(self.mongo_uri, self.db.name, prefix + str(k), self.poll_interval, self._stop))
+                    for k in range(self.workers)
+                ]
+            else:
+                self._stop = threading.Event()
+                self._running = [
+                    threading.Thread(target=GenerationWorker(self.db, prefix + str(k), self.poll_interval).serve,
+                                     args=(self._stop,), name=f"generation-{k}", daemon=True)
+                    for k in range(self.workers)
+                ]
+            for w in self._running:
+                w.start()
+            atexit.register(self.stop)
+
+    def stop(self, timeout=5):
+        """
+        Stops the workers after their current request; processes still busy
+        after `timeout` are terminated (their request resumes from its
+        checkpoint once the heartbeat goes stale).
+        """
+        if self._stop is None:
+            return
+        self._stop.set()
+        for w in self._running:
+            w.join(timeout)
+            if self.processes and w.is_alive():
+                w.terminate()
@@ -0,0 +1,341 @@
+import math
+from services.encoding import UNPLACED
+from services.ga_config import DAYS, SLOTS, FN_SLOTS, AN_SLOTS
+from services.search_budget import SearchBudget
+
+
+def random_target(problem, rng, node):
+    """Random timeslot for a session, honouring its FN/AN preference. None if invalid."""
+    s = problem.enc.session_data[node]
+    d = rng.choice(DAYS)
+    if s["pref_session"] == 'FN':
+        sl = rng.choice(sorted(FN_SLOTS))
+    elif s["pref_session"] == 'AN':
+        sl = rng.choice(sorted(AN_SLOTS))
+    else:
+        sl = rng.choice(SLOTS)
+    if s["type"] == "lab" and sl >= 8: # Lab needs 2 slots, can't start at 8
+        return None
+    return problem.enc.grid.index(d, sl)
+
+
+MOVE_TYPES = ("relocate", "swap", "kempe")
+
+
+def stats_summary(stats):
+    """Log line for move statistics: move type -> [proposed, feasible, accepted]."""
+    parts = []
+    for kind, (proposed, feasible, accepted) in stats.items():
+        rate = 100.0 * accepted / proposed if proposed else 0.0
+        parts.append(f"{kind} {accepted}/{feasible}/{proposed} ({rate:.1f}%)")
+    return "Moves accepted/feasible/proposed: " + ", ".join(parts)
+
+
+class LocalSearch:
+    """
+    Base local-search strategy over a ConstraintState + IncrementalFitness pair.
+
+    The driver loop (step/run) proposes a random move, checks it against the
+    hard constraints and rescores it incrementally; subclasses only decide
+    which moves to accept. The base class is plain hill climbing: only
+    strictly improving moves are kept.
+
+    A move is a list of (session, timeslot) pairs applied together:
+      - relocate: one session to a random timeslot
+      - swap:     two sessions of the same batch exchange timeslots
+      - kempe:    a Kempe chain - the connected part of the conflict graph
+                  sitting in two timeslots t1/t2 swaps them, so the sessions
+                  of the chain never clash with each other
+    `move_weights` sets how often each type is proposed; acceptance rates
+    per type are kept in `stats` and logged at the end of run().
+    """
+
+    name = "hill_climb"
+
+    KEMPE_MAX = 16 # longer chains are dropped, they rarely pass the other hard constraints
+
+    def __init__(self, problem, state, scorer, rng, move_weights=None, **params):
+        self.problem = problem
+        self.state = state
+        self.scorer = scorer
+        self.rng = rng
+        self.params = params
+
+        # The candidate is state.position itself: a rejected move is undone with
+        # undo_moves (from the old positions apply_moves returns), never copied
+        self.nodes = [node for node, t in enumerate(state.position.tolist()) if t != UNPLACED]
+
+        self.best_score = scorer.score
+        self.best_position = state.position.copy()
+        self.budget = None # set while run() is active
+
+        # Swap partners: placed sessions of each batch
+        self.by_batch = {}
+        batch_of = problem.enc.batch.tolist()
+        for node in self.nodes:
+            self.by_batch.setdefault(batch_of[node], []).append(node)
+        self._batch = batch_of
+
+        weights = dict(move_weights or {"relocate": 0.6, "swap": 0.25, "kempe": 0.15})
+        if getattr(problem, "conflicts", None) is None:
+            weights.pop("kempe", None)
+        self.move_kinds = [k for k in MOVE_TYPES if weights.get(k)]
+        self.move_weights = [weights[k] for k in self.move_kinds]
+
+        # move type -> [proposed, feasible, accepted]
+        self.stats = {k: [0, 0, 0] for k in self.move_kinds}
+
+    # ---------------- STRATEGY HOOKS ----------------
+    def accept(self, moves, before, after):
+        return after > before
+
+    def on_accept(self, moves, old):
+        pass
+
+    def end_iteration(self, i):
+        pass
+
+    # ---------------- MOVES ----------------
+    def in_domain(self, node, t):
+        return self.problem.domain_masks.get(node, 0) >> t & 1
+
+    def propose_relocate(self):
+        node = self.rng.choice(self.nodes)
+        t = random_target(self.problem, self.rng, node)
+        if t is None or t == self.state.position[node] or not self.in_domain(node, t):
+            return None
+        return [(node, t)]
+
+    def propose_swap(self):
+        a = self.rng.choice(self.nodes)
+        b = self.rng.choice(self.by_batch[self._batch[a]])
+        ta, tb = int(self.state.position[a]), int(self.state.position[b])
+        if ta == tb or not self.in_domain(a, tb) or not self.in_domain(b, ta):
+            return None
+        return [(a, tb), (b, ta)]
+
+    def propose_kempe(self):
+        v = self.rng.choice(self.nodes)
+        t1 = int(self.state.position[v])
+        t2 = random_target(self.problem, self.rng, v)
+        if t2 is None or t2 == t1:
+            return None
+
+        position = self.state.position
+        graph = self.problem.conflicts
+        chain, frontier = {v}, [v]
+        while frontier:
+            u = frontier.pop()
+            for w in graph.neighbors(u).tolist():
+                if w not in chain and position[w] in (t1, t2):
+                    chain.add(w)
+                    frontier.append(w)
+                    if len(chain) > self.KEMPE_MAX:
+                        return None
+
+        moves = []
+        for u in chain:
+            t = t2 if position[u] == t1 else t1
+            if not self.in_domain(u, t):
+                return None
+            moves.append((u, t))
+        return moves
+
+    # ---------------- DRIVER ----------------
+    def propose(self):
+        """A random candidate move as (kind, [(session, timeslot), ...]), or None."""
+        if not self.nodes:
+            return None
+        kind = self.rng.choices(self.move_kinds, self.move_weights)[0]
+        self.stats[kind][0] += 1
+        moves = getattr(self, "propose_" + kind)()
+        if moves is None:
+            return None
+        return kind, moves
+
+    def try_move(self, kind, moves, count=True):
+        """
+        Applies a move if it is feasible.
+        Returns (old positions, score before, score after), or None if infeasible.
+        """
+        before = self.scorer.score
+        old = self.state.apply_moves(moves)
+        if old is None:
+            return None
+        if count:
+            self.stats[kind][1] += 1
+        after = before
+        for node, t in moves:
+            after = self.scorer.move(node, t)
+        return old, before, after
+
+    def undo(self, moves, old):
+        self.state.undo_moves(moves, old)
+        for (node, _), o in zip(reversed(moves), reversed(old)):
+            self.scorer.move(node, o)
+
+    def step(self, i):
+        """One iteration. Returns True if it produced a new best."""
+        proposal = self.propose()
+        if proposal is None:
+            return False
+        kind, moves = proposal
+
+        result = self.try_move(kind, moves)
+        if result is None:
+            return False
+        old, before, after = result
+        if not self.accept(moves, before, after):
+            self.undo(moves, old)
+            return False
+
+        self.stats[kind][2] += 1
+        self.on_accept(moves, old)
+        return self.record_best()
+
+    def record_best(self):
+        if self.scorer.score > self.best_score:
+            self.best_score = self.scorer.score
+            self.best_position = self.state.position.copy()
+            return True
+        return False
+
+    def stats_summary(self):
+        return stats_summary(self.stats)
+
+    def run(self, iterations=None, heartbeat=50, budget=None):
+        """
+        Generator: yields ("LOG", msg) / ("PROGRESS", fraction) /
+        ("CHECKPOINT", (best_solution, best_score, steps)) while running and
+        returns (best_solution, best_score, fitness_curve).
+        Runs `iterations` steps, or until `budget` (a SearchBudget) runs out.
+        """
+        self.budget = budget or SearchBudget(max_steps=iterations)
+        curve = [self.best_score]
+        i = self.budget.steps # non-zero when resuming from a checkpoint
+        while not self.budget.exhausted():
+            improved = self.step(i)
+            if improved:
+                yield ("LOG", f"Iter {i}: New Best Score {self.best_score}")
+            self.end_iteration(i)
+            self.budget.step(improved)
+
+            # Progress and a checkpoint every `heartbeat` iterations (the worker keeps its own heartbeat)
+            if i % heartbeat == 0:
+                yield ("PROGRESS", self.budget.fraction())
+                yield ("CHECKPOINT", (self.best_position, self.best_score, self.budget.steps))
+                curve.append(self.best_score)
+            i += 1
+
+        yield ("LOG", f"Stopped after {i} iterations: {self.budget.reason()}")
+        yield ("LOG", self.stats_summary())
+        self.budget = None
+        return self.best_position, self.best_score, curve
+
+
+HillClimbing = LocalSearch
+
+
+class SimulatedAnnealing(LocalSearch):
+    """
+    Accepts worsening moves with probability exp(delta / T) so the search can
+    leave local optima. T follows a configurable cooling schedule:
+      - geometric: T <- T * alpha every iteration
+      - linear:    T falls from initial_temp to min_temp over `iterations`
+                   (or over the time budget when run() is given one)
+    """
+
+    name = "annealing"
+
+    def __init__(self, problem, state, scorer, rng, initial_temp=20.0, min_temp=0.05,
+                 cooling="geometric", alpha=0.999, iterations=1000, **params):
+        super().__init__(problem, state, scorer, rng, **params)
+        self.initial_temp = initial_temp
+        self.min_temp = min_temp
+        self.cooling = cooling
+        self.alpha = alpha
+        self.iterations = max(1, iterations or 1000) # linear schedule length without a time budget
+        self.temp = initial_temp
+
+    def accept(self, moves, before, after):
+        delta = after - before
+        if delta >= 0:
+            return True
+        return self.rng.random() < math.exp(delta / max(self.temp, 1e-9))
+
+    def end_iteration(self, i):
+        if self.cooling == "linear":
+            if self.budget is not None and self.budget.time_limit:
+                frac = self.budget.fraction()
+            else:
+                frac = min(1.0, (i + 1) / self.iterations)
+            self.temp = self.initial_temp - (self.initial_temp - self.min_temp) * frac
+        else:
+            self.temp = max(self.min_temp, self.temp * self.alpha)
+
+
+class TabuSearch(LocalSearch):
+    """
+    Samples `candidates` feasible moves per iteration and takes the best one
+    that is not tabu, even if it is worsening. Moving a session away from a
+    timeslot makes the (session, timeslot) pair tabu for `tenure` iterations,
+    so the search does not immediately undo itself; a swap or chain is tabu if
+    any of its sessions would return to a tabu timeslot. A tabu move is still
+    allowed if it yields a new overall best (aspiration).
+    """
+
+    name = "tabu"
+
+    def __init__(self, problem, state, scorer, rng, tenure=25, candidates=12, **params):
+        super().__init__(problem, state, scorer, rng, **params)
+        self.tenure = tenure
+        self.candidates = candidates
+        self.tabu = {} # (session, timeslot) -> iteration it expires
+
+    def step(self, i):
+        best_move = None
+        for _ in range(self.candidates):
+            proposal = self.propose()
+            if proposal is None:
+                continue
+            kind, moves = proposal
+
+            result = self.try_move(kind, moves)
+            if result is None:
+                continue
+            old, before, after = result
+            self.undo(moves, old)
+
+            is_tabu = any(self.tabu.get(move, -1) > i for move in moves)
+            if is_tabu and after <= self.best_score:
+                continue
+            if best_move is None or after > best_move[2]:
+                best_move = (kind, moves, after)
+
+        if best_move is None:
+            return False
+
+        kind, moves, _ = best_move
+        old, _, _ = self.try_move(kind, moves, count=False)
+        self.stats[kind][2] += 1
+        for (node, _), o in zip(moves, old):
+            self.tabu[(node, o)] = i + self.tenure
+
+        # Forget expired entries now and then so the dict stays small
+        if i % 256 == 0:
+            self.tabu = {k: v for k, v in self.tabu.items() if v > i}
+        return self.record_best()
+
+
+STRATEGIES = {
+    "hill_climb": HillClimbing,
+    "annealing": SimulatedAnnealing,
+    "tabu": TabuSearch,
+}
+
+
+def make_strategy(name, problem, state, scorer, rng, **params):
+    """Builds the local-search strategy registered under `name`."""
+    if name not in STRATEGIES:
+        raise ValueError(f"Unknown local search strategy: {name}")
+    return STRATEGIES[name](problem, state, scorer, rng, **params)
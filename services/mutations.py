@@ -1,5 +1,16 @@
 import random
-import copy
+
+def copy_on_write_day(timetables, batch_id, day):
+    """
+    Structurally shared child of `timetables` where only the given batch/day
+    is a fresh dict. Every other batch, day and slot entry is shared with the
+    parent, so a child costs O(changes) instead of a full deep copy.
+    Entries themselves are treated as immutable and never edited in place.
+    """
+    child = dict(timetables)
+    child[batch_id] = dict(timetables[batch_id])
+    child[batch_id][day] = dict(timetables[batch_id][day])
+    return child, child[batch_id][day]
 
 def swap_two_theory_sessions(timetables):
     """
@@ -19,24 +30,22 @@ def swap_two_theory_sessions(timetables):
     So this is tricky. Simple swap might create invalid offspring.
     SAFE APPROACH: Try swap, check validity. If invalid, revert.
     """
-    # Deep copy to create child
-    child = copy.deepcopy(timetables)
-
     # Pick random batch
-    if not child: return child
-    batch_id = random.choice(list(child.keys()))
+    if not timetables: return dict(timetables)
+    batch_id = random.choice(list(timetables.keys()))
     
     # Pick random day(s)
-    days = list(child[batch_id].keys())
+    days = list(timetables[batch_id].keys())
     day = random.choice(days)
     
-    slots = child[batch_id][day]
-    
     # Identify Theory Slots
-    theory_slots = [s for s,v in slots.items() if v and v['type']=='THEORY']
+    theory_slots = [s for s,v in timetables[batch_id][day].items() if v and v['type']=='THEORY']
     
     if len(theory_slots) < 2:
-        return child # Cannot swap within day if < 2
+        return dict(timetables) # Cannot swap within day if < 2
+
+    # Child shares everything with the parent except the mutated day
+    child, slots = copy_on_write_day(timetables, batch_id, day)
 
     # Swap
     s1, s2 = random.sample(theory_slots, 2)
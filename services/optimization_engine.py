@@ -4,19 +4,27 @@ from datetime import datetime
 from bson import ObjectId
 
 class OptimizationScheduler:
-    def __init__(self, db, req_id):
+    def __init__(self, db, req_id, worker=None):
+        # worker: name of the GenerationWorker that claimed the request; its writes
+        # to the request (and the timetables) only go through while it still owns it
         self.db = db
         self.req_id = req_id
+        self.worker = worker
         self.req = db.batch_generation_request.find_one({'_id': ObjectId(req_id)})
         self.batches = list(db.batches.find({'_id': {'$in': self.req['batch_ids']}}))
-        self.logs = []
+
+    def update_request(self, update):
+        """Applies `update` to the request if this run still owns it, else raises ClaimLost."""
+        from services.checkpoint import ClaimLost
+        owner = {'_id': ObjectId(self.req_id)}
+        if self.worker is not None:
+            owner['worker'] = self.worker
+        if not self.db.batch_generation_request.update_one(owner, update).matched_count:
+            raise ClaimLost(f"Request {self.req_id} is no longer claimed by {self.worker}")
 
     def log(self, message):
-        """Log to database and yield for streaming."""
+        """Timestamped log line for the stream; the worker appends it to the request's logs."""
         entry = f"[{datetime.now().strftime('%H:%M:%S')}] {message}"
-        self.logs.append(entry)
-        # Update db logs (optional, maybe execute in bulk later to save DB hits)
-        # self.db.batch_generation_request.update_one(...)
         return f"{entry}\n"
 
     def run(self):
@@ -81,12 +89,30 @@ class OptimizationScheduler:
         all_timetables = {}
         fitness_curve = []
         
-        gen = run_custom_ga(self.db, self.req['batch_ids'])
+        engine = self.req.get('engine', 'hill_climb')
+        yield self.log(f"Search Engine: {engine}")
+        # Anytime mode: the request may carry a wall-clock budget and a stagnation limit
+        options = dict(self.req.get('engine_options') or {})
+        if self.req.get('time_limit'):
+            options['time_limit'] = self.req['time_limit']
+            yield self.log(f"Time Budget: {self.req['time_limit']}s")
+        if self.req.get('stagnation_limit'):
+            options['stagnation'] = self.req['stagnation_limit']
+            yield self.log(f"Stagnation Limit: {self.req['stagnation_limit']}")
+        # Progress is checkpointed on the request; a re-run of the same request resumes from it
+        from services.checkpoint import RunCheckpoint, ClaimLost
+        checkpoint = RunCheckpoint(self.db, self.req_id, worker=self.worker)
+        self.update_request({'$set': {'status': 'RUNNING'}})
+        gen = run_custom_ga(self.db, self.req['batch_ids'], engine=engine, options=options,
+                            checkpoint=checkpoint)
         
         try:
             for event_type, payload in gen:
                 if event_type == "LOG":
                     yield self.log(payload)
+                elif event_type == "PROGRESS":
+                    # Search progress (0..1) mapped into the optimisation phase (30% -> 90%)
+                    yield f"PROGRESS:{30 + int(payload * 60)}\n"
                 elif event_type == "RESULT":
                     all_timetables, fitness_curve = payload
                     
@@ -103,6 +129,9 @@ class OptimizationScheduler:
         yield self.log("Phase 5: Committing Timetables...")
         
         try:
+            # Fence: refreshing the heartbeat while still the owner means no other worker
+            # can claim the request (it is not stale) while the timetables are replaced
+            self.update_request({'$set': {'heartbeat_at': datetime.now()}})
             # Save results
             for batch_id, tt_data in all_timetables.items():
                 batch_name = "Batch"
@@ -119,14 +148,13 @@ class OptimizationScheduler:
                     'generated_by_request': self.req_id
                 })
             
-            # Update request status AND Fitness Curve
-            self.db.batch_generation_request.update_one(
-                {'_id': ObjectId(self.req_id)},
+            # Update request status AND Fitness Curve (the run is done, drop its checkpoint)
+            self.update_request(
                 {'$set': {
                     'status': 'COMPLETED', 
-                    'logs': self.logs,
                     'fitness_curve': fitness_curve
-                }}
+                },
+                 '$unset': {'checkpoint': ''}}
             )
 
             yield self.log("Optimization Pipeline Completed Successfully! 🚀")
@@ -134,6 +162,8 @@ class OptimizationScheduler:
             yield "STATUS:COMPLETED\n"
             yield "DONE\n"
             
+        except ClaimLost:
+            raise
         except Exception as e:
             yield self.log(f"FATAL PIPELINE ERROR: {str(e)}")
             yield self.log(traceback.format_exc().replace('\n', '<br>'))
@@ -141,6 +171,6 @@ class OptimizationScheduler:
             # Ensure we don't hang the UI
             yield "DONE\n"
 
-def run_optimization_pipeline(db, req_id):
-    scheduler = OptimizationScheduler(db, req_id)
+def run_optimization_pipeline(db, req_id, worker=None):
+    scheduler = OptimizationScheduler(db, req_id, worker)
     return scheduler.run()
@@ -0,0 +1,186 @@
+import os
+import random
+import numpy as np
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor
+from services.encoding import UNPLACED
+from services.ga_config import POOL_START_METHOD
+from services.search_budget import SearchBudget
+
+# A forced (infeasible) placement must always lose against any feasible timetable
+HARD_PENALTY = 1000
+
+# Problem shared by every task in a pool worker process (set once by _init_worker).
+# Only pool workers set it: with one worker the tasks run inline and are handed the
+# run's own problem, so concurrent runs in one process (threads) never share it.
+_problem = None
+
+
+def _init_worker(problem):
+    global _problem
+    _problem = problem
+
+
+def _in_worker(task):
+    """Pool task: runs fn(problem, args) against the worker's problem."""
+    fn, args = task
+    return fn(_problem, args)
+
+
+def _evaluate(problem, state, forced, rng=None, moves=0):
+    """
+    Fitness of a repaired individual (soft score minus hard violations),
+    after up to `moves` non-worsening local moves (memetic mutation).
+    """
+    scorer = problem.new_scorer(state.position)
+    n = len(state.position)
+    for _ in range(moves):
+        i = rng.randrange(n)
+        slots = problem.domain.get(i)
+        if not slots:
+            continue
+        t = rng.choice(slots)
+        if not state.can_move(i, t):
+            continue
+        before = scorer.score
+        old = state.apply_move(i, t)
+        if scorer.move(i, t) < before:
+            state.undo_move(i, old)
+            scorer.move(i, old)
+    solution = state.position.copy()
+    return solution, scorer.score - HARD_PENALTY * forced, forced
+
+
+def _perturb(problem, state, rng, moves):
+    """A few random feasible single-session moves (diversity, no scoring)."""
+    n = len(state.position)
+    for _ in range(moves):
+        i = rng.randrange(n)
+        slots = problem.domain.get(i)
+        if not slots:
+            continue
+        t = rng.choice(slots)
+        if state.can_move(i, t):
+            state.apply_move(i, t)
+
+
+def _seed_individual(problem, args):
+    """Initial population member: the DSATUR solution perturbed by random moves."""
+    solution, seed, moves = args
+    rng = random.Random(seed)
+    state, forced = problem.repair(solution, rng)
+    _perturb(problem, state, rng, moves)
+    return _evaluate(problem, state, forced)
+
+
+def _crossover(problem, a, b, mode, rng):
+    """
+    Block crossover between two parents (session -> timeslot arrays).
+      - batch: each batch's whole week comes from one parent
+      - day:   each session follows the parent chosen for the day it has in `a`
+    """
+    enc = problem.enc
+    np_rng = np.random.default_rng(rng.getrandbits(32))
+    if mode == "day":
+        days = np_rng.random(enc.grid.n_days) < 0.5
+        take_a = days[np.maximum(a, 0) // enc.grid.n_slots]
+    else:
+        batches = np_rng.random(len(enc.batches)) < 0.5
+        take_a = batches[enc.batch]
+    child = np.where(take_a, a, b)
+    # Never leave a session unplaced if either parent placed it
+    return np.where(child == UNPLACED, np.maximum(a, b), child).astype(np.int16)
+
+
+def _breed(problem, args):
+    """Crossover + repair + mutation + evaluation of one child (runs in a worker)."""
+    a, b, mode, seed, moves = args
+    rng = random.Random(seed)
+    child = _crossover(problem, a, b, mode, rng)
+    state, forced = problem.repair(child, rng)
+    return _evaluate(problem, state, forced, rng, moves)
+
+
+class PopulationGA:
+    """
+    Population-based GA over SessionEncoding solutions.
+
+    Each generation: tournament selection, batch- or day-block crossover,
+    repair back to feasibility, mutation (short non-worsening local search),
+    then elitism. Breeding and fitness evaluation of the children fan out
+    over a process pool.
+    """
+
+    def __init__(self, problem, population_size=16, generations=30, tournament_size=3,
+                 elite=2, crossover="batch", mutation_moves=50, workers=None, seed=None):
+        self.problem = problem
+        self.population_size = max(2, population_size)
+        self.generations = generations
+        self.tournament_size = tournament_size
+        self.elite = min(elite, self.population_size - 1)
+        self.crossover = crossover
+        self.mutation_moves = mutation_moves
+        self.workers = workers or os.cpu_count() or 1
+        self.rng = random.Random(seed)
+        self.fitness_history = []
+
+    def select(self, population):
+        contenders = self.rng.sample(population, min(self.tournament_size, len(population)))
+        return max(contenders, key=lambda ind: ind[1])
+
+    def run(self, initial, budget=None):
+        """
+        Generator: yields ("LOG", msg) / ("PROGRESS", fraction) /
+        ("CHECKPOINT", (best_solution, best_score, generations done)) while running and returns
+        (best_solution, best_score, fitness_history).
+        Runs `generations` generations, or until `budget` (a SearchBudget counting
+        generations) runs out.
+        """
+        budget = budget or SearchBudget(max_steps=self.generations)
+        if self.workers > 1:
+            pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=mp.get_context(POOL_START_METHOD),
+                                       initializer=_init_worker,
+                                       initargs=(self.problem,))
+            pmap = lambda fn, tasks: list(pool.map(_in_worker, [(fn, t) for t in tasks],
+                                                   chunksize=max(1, len(tasks) // (self.workers * 2))))
+        else:
+            pool = None
+            pmap = lambda fn, tasks: [fn(self.problem, t) for t in tasks]
+
+        try:
+            yield ("LOG", f"Population GA: {self.population_size} individuals, {self.workers} worker(s), {self.crossover} crossover")
+
+            tasks = [(initial, self.rng.getrandbits(32), 0 if k == 0 else self.mutation_moves)
+                     for k in range(self.population_size)]
+            population = pmap(_seed_individual, tasks)
+            population.sort(key=lambda ind: ind[1], reverse=True)
+            best = population[0]
+            self.fitness_history.append(best[1])
+
+            gen = budget.steps # non-zero when resuming from a checkpoint
+            while not budget.exhausted():
+                gen += 1
+                tasks = []
+                for _ in range(self.population_size - self.elite):
+                    a = self.select(population)[0]
+                    b = self.select(population)[0]
+                    tasks.append((a, b, self.crossover, self.rng.getrandbits(32), self.mutation_moves))
+
+                children = pmap(_breed, tasks)
+                population = sorted(population[:self.elite] + children, key=lambda ind: ind[1], reverse=True)
+
+                improved = population[0][1] > best[1]
+                if improved:
+                    best = population[0]
+                    yield ("LOG", f"GA Gen {gen}: New Best Score {best[1]} (forced: {best[2]})")
+                budget.step(improved)
+                self.fitness_history.append(best[1])
+                yield ("PROGRESS", budget.fraction())
+                yield ("CHECKPOINT", (best[0], best[1], budget.steps))
+
+            yield ("LOG", f"Stopped after {gen} generations: {budget.reason()}")
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+
+        return best[0], best[1], self.fitness_history
@@ -0,0 +1,253 @@
+import time
+import random
+from services.encoding import UNPLACED
+
+
+class SearchLimit(Exception):
+    """Raised when a repair search runs out of nodes, checks or time."""
+
+
+class BacktrackingRepair:
+    """
+    Exact repair for the sessions a heuristic pass could not place.
+
+    For each unplaced session the placed sessions competing with it (same
+    batch / same faculty, its neighbourhood) are lifted, and the session plus
+    its neighbourhood are re-placed by a depth-first search:
+      - MRV: the session with the fewest feasible values goes next
+      - forward checking: after each placement the related sessions drop the
+        values that no longer fit; an empty domain backtracks at once
+      - lifted sessions try their old value first, so most go straight back
+    The search gives up after `max_nodes` placements and then puts the
+    neighbourhood back exactly as it was; the session stays unplaced for the
+    caller's own fallback. Once `max_total` placements have been spent over
+    all sessions the rest are not tried, which bounds the cost on hopeless
+    (over-constrained) inputs.
+
+    Placements are cheap to count but not what the search pays for: each one
+    forward-checks every related domain, so one node can cost hundreds of
+    fits() calls. `max_checks` (fits() evaluations) and `time_limit` (seconds)
+    bound the whole run() directly; when either runs out the current search
+    is undone like any other failure and the remaining sessions are skipped.
+
+    Works on a model exposing:
+      values(i)       candidate values of session i
+      fits(i, v)      whether i can take v given the current placements
+      place(i, v), remove(i), current(i)
+      neighbours(i)   placed sessions that compete with i
+      related(i, j)   whether placing i can change which values fit j
+      scope(v)        placing at v only affects values with the same scope (the day)
+    """
+
+    def __init__(self, model, max_nodes=2000, max_total=20000, max_checks=None, time_limit=None):
+        self.model = model
+        self.max_nodes = max_nodes
+        self.max_total = max_total
+        self.max_checks = max_checks
+        self.time_limit = time_limit
+        self.nodes = 0
+        self.total = 0
+        self.checks = 0 # fits() evaluations over the whole run
+        self.deadline = None
+        self.trail = [] # sessions placed by the current search, in order
+
+    def run(self, targets):
+        """Tries to place every session of `targets`; returns those still unplaced."""
+        if self.time_limit is not None:
+            self.deadline = time.monotonic() + self.time_limit
+        failed = []
+        for i in targets:
+            if self.total >= self.max_total or self.spent() or not self.place_one(i):
+                failed.append(i)
+        return failed
+
+    def spent(self):
+        """Whether the fits() or wall-clock allowance of run() is used up."""
+        if self.max_checks is not None and self.checks >= self.max_checks:
+            return True
+        return self.deadline is not None and time.monotonic() >= self.deadline
+
+    def fits(self, i, v):
+        self.checks += 1
+        # The clock is only read every 64 checks, fits() itself is a few microseconds
+        if (self.max_checks is not None and self.checks > self.max_checks) or \
+                (self.deadline is not None and self.checks % 64 == 0 and time.monotonic() >= self.deadline):
+            raise SearchLimit()
+        return self.model.fits(i, v)
+
+    def place_one(self, i):
+        model = self.model
+        lifted = {j: model.current(j) for j in model.neighbours(i)}
+        for j in lifted:
+            model.remove(j)
+
+        self.nodes = 0
+        self.trail = []
+        try:
+            ok = self._search(self._domains([i] + list(lifted), lifted))
+        except SearchLimit:
+            ok = False
+        self.total += self.nodes
+        if not ok:
+            for j in reversed(self.trail):
+                model.remove(j)
+            for j, v in lifted.items():
+                model.place(j, v)
+        return ok
+
+    def _domains(self, variables, preferred):
+        domains = {}
+        for i in variables:
+            values = [v for v in self.model.values(i) if self.fits(i, v)]
+            old = preferred.get(i)
+            if old in values:
+                values.remove(old)
+                values.insert(0, old)
+            domains[i] = values
+        return domains
+
+    def _search(self, domains):
+        if not domains:
+            return True
+        if any(not values for values in domains.values()):
+            return False
+        model = self.model
+        i = min(domains, key=lambda k: len(domains[k])) # MRV
+        values = domains.pop(i)
+
+        for v in values:
+            self.nodes += 1
+            if self.nodes > self.max_nodes:
+                domains[i] = values
+                raise SearchLimit()
+            model.place(i, v)
+            self.trail.append(i)
+
+            # Forward checking: only related sessions on the same day can lose values
+            scope = model.scope(v)
+            pruned = {}
+            for j, dom in domains.items():
+                if not model.related(i, j):
+                    continue
+                kept = [w for w in dom if model.scope(w) != scope or self.fits(j, w)]
+                if len(kept) != len(dom):
+                    pruned[j] = dom
+                    domains[j] = kept
+            try:
+                if all(domains[j] for j in pruned) and self._search(domains):
+                    return True
+            finally:
+                domains.update(pruned)
+            model.remove(i)
+            self.trail.pop()
+
+        domains[i] = values
+        return False
+
+
+class StateModel:
+    """BacktrackingRepair model over a ConstraintState (custom GA); values are timeslots."""
+
+    def __init__(self, problem, state, rng=random):
+        self.problem = problem
+        self.state = state
+        self.rng = rng
+        self.n_slots = problem.enc.grid.n_slots
+        self._faculty = state._faculty
+        self._batch = state._batch
+        self._pool = state._pool
+
+    def values(self, i):
+        slots = list(self.problem.domain.get(i, ()))
+        self.rng.shuffle(slots)
+        return slots
+
+    def fits(self, i, t):
+        return self.state.can_place(i, t)
+
+    def place(self, i, t):
+        self.state.apply_move(i, t)
+
+    def remove(self, i):
+        self.state.undo_move(i, UNPLACED)
+
+    def current(self, i):
+        return int(self.state.position[i])
+
+    def neighbours(self, i):
+        position = self.state.position
+        return [j for j in self.problem.conflicts.neighbors(i).tolist() if position[j] != UNPLACED]
+
+    def related(self, i, j):
+        return (self._faculty[i] == self._faculty[j] or self._batch[i] == self._batch[j]
+                or (self._pool[i] >= 0 and self._pool[i] == self._pool[j]))
+
+    def scope(self, t):
+        return t // self.n_slots
+
+
+class SchedulerModel:
+    """
+    BacktrackingRepair model over a MultiBatchScheduler; values are
+    (day, slots, faculty id) and the room is picked (best fit) on placement.
+    """
+
+    def __init__(self, scheduler, sessions, placements, strict_mode=True, rng=random):
+        # placements: session index -> ((day, slots, faculty id), room), kept up to date
+        self.scheduler = scheduler
+        self.sessions = sessions
+        self.placements = placements
+        self.strict_mode = strict_mode
+        self.rng = rng
+        self.faculty = [{str(f['_id']): f for f in s['faculty_pool']} for s in sessions]
+
+    def values(self, i):
+        sess = self.sessions[i]
+        values = []
+        for day in self.scheduler.days:
+            for start in sess['valid_slots']:
+                slots = tuple(str(s) for s in start) if isinstance(start, tuple) else (str(start),)
+                values.extend((day, slots, fid) for fid in self.faculty[i])
+        self.rng.shuffle(values)
+        return values
+
+    def fits(self, i, value):
+        day, slots, fid = value
+        sess = self.sessions[i]
+        sch = self.scheduler
+        slots = list(slots)
+        # Hard constraints only: the compactness (gap) check depends on the order the
+        # sessions are placed in, so re-placing a neighbourhood could never satisfy it
+        if not sch.is_clean_batch_slot_v2(sess['batch_id'], day, slots, sess):
+            return False
+        if not sch.can_teach(self.faculty[i][fid], sess, day, slots, self.strict_mode):
+            return False
+        return sch.find_room(sess, day, slots) is not None
+
+    def place(self, i, value):
+        day, slots, fid = value
+        sess = self.sessions[i]
+        room = self.scheduler.find_room(sess, day, list(slots))
+        self.scheduler.register_allocation(sess, day, list(slots), self.faculty[i][fid], room)
+        self.placements[i] = (value, room)
+
+    def remove(self, i):
+        (day, slots, fid), room = self.placements.pop(i)
+        self.scheduler.unregister_allocation(self.sessions[i], day, list(slots), self.faculty[i][fid], room)
+
+    def current(self, i):
+        return self.placements[i][0]
+
+    def neighbours(self, i):
+        batch = self.sessions[i]['batch_id']
+        pool = self.faculty[i]
+        return [j for j, (value, _) in self.placements.items()
+                if self.sessions[j]['batch_id'] == batch or value[2] in pool]
+
+    def related(self, i, j):
+        a, b = self.sessions[i], self.sessions[j]
+        return (a['batch_id'] == b['batch_id'] or a['room_type'] == b['room_type']
+                or not self.faculty[i].keys().isdisjoint(self.faculty[j]))
+
+    def scope(self, value):
+        return value[0]
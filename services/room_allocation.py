@@ -0,0 +1,148 @@
+import bisect
+import numpy as np
+from services.encoding import UNPLACED
+from services.bitmask import SlotMasks
+
+
+class RoomPools:
+    """
+    Room model for the custom GA.
+
+    Rooms are grouped into pools by session type (lecture halls for theory,
+    labs for labs) and a session may use any room of its pool whose capacity
+    is at least its batch size. Those eligibility sets are nested, so every
+    session in a timeslot can get a room exactly when, for each size threshold,
+    the sessions needing at least that size do not outnumber the free rooms
+    that are at least that big (Hall's condition for a chain).
+
+    The search therefore only tracks counts per (pool, size class, timeslot)
+    against `free`; concrete rooms are matched once, per timeslot, by allocate().
+    """
+
+    def __init__(self, grid, pool_rooms, sessions, external_busy=None):
+        # pool_rooms: pool (session type) -> list of room docs with 'number' and 'capacity'
+        # sessions: session dicts with 'type' and 'batch_size'
+        # external_busy: room number -> week bitmask of slots used by timetables outside this run
+        external_busy = external_busy or {}
+        self.grid = grid
+        self.names = list(pool_rooms)
+        self.rooms = [sorted(pool_rooms[p], key=lambda r: int(r.get('capacity') or 0)) for p in self.names]
+        self.capacity = [[int(r.get('capacity') or 0) for r in rooms] for rooms in self.rooms]
+        self.busy = [[external_busy.get(r['number'], 0) for r in rooms] for rooms in self.rooms]
+
+        n = len(sessions)
+        self.pool = np.full(n, -1, dtype=np.int32)  # -1 = pool has no rooms: unchecked, room "TBD"
+        self.need = np.zeros(n, dtype=np.int32)     # capacity the session needs
+        self.cls = np.zeros(n, dtype=np.int32)      # index of `need` in the pool's thresholds
+        for i, s in enumerate(sessions):
+            if s["type"] not in pool_rooms:
+                continue
+            p = self.names.index(s["type"])
+            if not self.capacity[p]:
+                continue
+            self.pool[i] = p
+            # A batch bigger than every room still gets the biggest one
+            self.need[i] = min(int(s.get("batch_size") or 0), self.capacity[p][-1])
+
+        # Per pool: sorted distinct needs, and free[c, t] = rooms with capacity >= thresholds[c] free at t
+        self.thresholds = []
+        self.free = []
+        for p in range(len(self.names)):
+            needs = sorted({int(x) for x in self.need[self.pool == p]})
+            self.thresholds.append(needs)
+            free = np.zeros((len(needs), grid.size), dtype=np.int16)
+            for c, need in enumerate(needs):
+                for cap, busy in zip(self.capacity[p], self.busy[p]):
+                    if cap >= need:
+                        free[c] += [not (busy >> t & 1) for t in range(grid.size)]
+            self.free.append(free)
+        for i in np.flatnonzero(self.pool >= 0):
+            self.cls[i] = self.thresholds[self.pool[i]].index(int(self.need[i]))
+
+    def contended(self, length, ratio):
+        """
+        Sessions competing for scarce rooms: for every (pool, size class) whose
+        sessions (those needing at least that capacity) use more than `ratio`
+        of the room-slots big enough for them, the indices of those sessions.
+        length: session index -> slots it occupies. Returns a list of index arrays.
+        """
+        groups = []
+        for p, free in enumerate(self.free):
+            for c in range(len(self.thresholds[p])):
+                members = np.flatnonzero((self.pool == p) & (self.cls >= c))
+                supply = int(free[c].sum())
+                if len(members) > 1 and int(length[members].sum()) > ratio * supply:
+                    groups.append(members)
+        return groups
+
+    def allocate(self, solution, length):
+        """
+        Matches concrete rooms to a finished solution, timeslot by timeslot.
+        In each timeslot the sessions are taken by decreasing need and each gets
+        the smallest free room that is big enough (best fit over the capacity
+        index). For nested eligibility this finds a full matching whenever one
+        exists. A lab keeps its room for both slots.
+        Returns a list: session index -> room number, or "TBD" if none was free.
+        """
+        rooms = ["TBD"] * len(solution)
+        starting = {}
+        for i, t in enumerate(solution.tolist()):
+            if t != UNPLACED and self.pool[i] >= 0:
+                starting.setdefault(t, []).append(i)
+
+        taken = [[0] * len(r) for r in self.rooms] # pool -> room -> bitmask of timeslots in use
+        for t in sorted(starting):
+            for i in sorted(starting[t], key=lambda i: -self.need[i]):
+                p = self.pool[i]
+                cells = ((1 << int(length[i])) - 1) << t
+                caps = self.capacity[p]
+                k = bisect.bisect_left(caps, int(self.need[i]))
+                chosen = None
+                for r in range(k, len(caps)):
+                    if not (self.busy[p][r] | taken[p][r]) & cells:
+                        chosen = r
+                        break
+                if chosen is None:
+                    continue
+                taken[p][chosen] |= cells
+                rooms[i] = self.rooms[p][chosen]['number']
+        return rooms
+
+
+def share_rooms(grid, pool_rooms, sessions, labels, parts, external_busy=None):
+    """
+    Splits the rooms between `parts` independent sub-problems (see
+    decomposition.py) so they can be searched apart and still merge into a
+    room-feasible timetable.
+
+    Every room-day of a pool goes to one part, in proportion to the slots the
+    part's sessions need from that pool. Room-days are dealt day by day
+    (stride scheduling), so each part gets rooms on every day and of every
+    size; whole days keep both halves of a lab in the same room.
+    labels: session index -> part. Returns one external_busy dict per part
+    (room number -> week bitmask) where the room-days of the other parts count as busy.
+    """
+    external_busy = external_busy or {}
+    masks = SlotMasks(grid)
+    shares = [dict(external_busy) for _ in range(parts)]
+    for pool, rooms in pool_rooms.items():
+        demand = [0] * parts
+        for s, k in zip(sessions, labels):
+            if s["type"] == pool:
+                demand[int(k)] += 2 if s["type"] == "lab" else 1
+        wanted = [k for k in range(parts) if demand[k]]
+        if not wanted:
+            continue
+        rooms = sorted(rooms, key=lambda r: -int(r.get('capacity') or 0))
+        passes = {k: 0.0 for k in wanted}
+        for day in masks.day:
+            for r in rooms:
+                cells = day & ~external_busy.get(r['number'], 0)
+                if not cells:
+                    continue
+                owner = min(wanted, key=lambda k: passes[k])
+                passes[owner] += bin(cells).count("1") / demand[owner]
+                for k in range(parts):
+                    if k != owner:
+                        shares[k][r['number']] = shares[k].get(r['number'], 0) | cells
+    return shares
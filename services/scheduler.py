@@ -1,96 +1,88 @@
 from bson import ObjectId
 import random
+import bisect
+import itertools
+import numpy as np
 from collections import defaultdict
+from services.encoding import Interner, TimeGrid
+from services.bitmask import SlotMasks
+
+DAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
+SLOTS = [str(i) for i in range(1, 10)]
+
+# Bounds of the one backtracking repair run on a finished timetable
+REPAIR_MAX_CHECKS = 100000 # fits() evaluations
+REPAIR_TIME_LIMIT = 2.0 # seconds
+
+
+class ProblemSnapshot:
+    """
+    Everything MultiBatchScheduler reads from the database for one run,
+    loaded once (7 queries) and then only read:
+      - batches, faculty and rooms (rooms by type, sorted by capacity)
+      - busy slots per faculty/room id from TEACHER_AVAILABILITY and from the
+        timetables of the batches outside this run
+      - the expanded sessions, already in DSATUR order
+    Every allocate() starts from it, so population members and retries only
+    differ in their randomised allocation.
+    """
 
-class MultiBatchScheduler:
     def __init__(self, db, batch_ids):
-        self.db = db
         self.batch_ids = [ObjectId(bid) for bid in batch_ids]
-        self.days = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri']
-        self.slots = [str(i) for i in range(1, 10)]
-        self.debug_logs = []
-        
-        # Global State
-        self.availability_matrix = defaultdict(dict) # key=entity_id (fac/room), val={day_slot: True}
-        self.daily_load = defaultdict(lambda: defaultdict(int)) # key=fac_id, val={day: count}
-        self.timetables = {} # key=batch_id, val={day: {slot: entry}}
-        self.course_day_usage = defaultdict(lambda: defaultdict(set)) # batch_id -> course_code -> set(days)
-        
-        # Hard Constraints Configurations
-        # We model breaks as boundaries. If a 2-hr block crosses a boundary, it's invalid.
-        # Break after Slot 2. Lunch after Slot 5.
-        self.break_boundaries = {2, 5} 
-
-    def violates_continuous_teaching(self, faculty_id, day, req_slots):
-        """
-        Ensures faculty does NOT teach more than 2 continuous slots.
-        """
-        occupied = set()
-
-        # Collect already occupied slots for faculty on this day
-        # From Global Availability
-        # Keys are "Mon_1", "Mon_2" etc
-        prefix = f"{day}_"
-        for key in self.availability_matrix.get(faculty_id, {}):
-            if key.startswith(prefix):
-                slot_num = int(key.split('_')[1])
-                occupied.add(slot_num)
-
-        # Include proposed slots
-        proposed = [int(s) for s in req_slots]
-        all_slots = sorted(occupied.union(proposed))
-
-        # Check for continuous runs > 2
-        streak = 1
-        for i in range(1, len(all_slots)):
-            if all_slots[i] == all_slots[i-1] + 1:
-                streak += 1
-                if streak > 2:
-                    return True
-            else:
-                streak = 1
+        self.days = DAYS
+        self.slots = SLOTS
+        self.grid = TimeGrid(self.days, self.slots)
 
-        return False
-        
-    def log(self, msg):
-        self.debug_logs.append(msg)
+        self.batches = list(db.batches.find({'_id': {'$in': self.batch_ids}}))
+        self.all_faculty = list(db.faculty.find())
+        self.all_rooms = list(db.rooms.find())
+        # Rooms per type sorted by capacity, so the best-fit room is found by bisection
+        self.rooms_by_type = defaultdict(list)
+        for r in sorted(self.all_rooms, key=lambda r: int(r.get('capacity') or 0)):
+            self.rooms_by_type[r.get('type')].append(r)
+        self.room_caps = {t: [int(r.get('capacity') or 0) for r in rooms] for t, rooms in self.rooms_by_type.items()}
 
-    def load_data(self):
-        self.batches = list(self.db.batches.find({'_id': {'$in': self.batch_ids}}))
-        self.all_faculty = list(self.db.faculty.find())
-        self.all_rooms = list(self.db.rooms.find())
+        # entity id (fac/room) -> week bitmask of slots that are never free in this run
+        self.busy = defaultdict(int)
         
         # Load Existing Constraints (Faculty Unavailability)
-        constraints = list(self.db.constraints.find({'rule': 'TEACHER_AVAILABILITY'}))
+        constraints = list(db.constraints.find({'rule': 'TEACHER_AVAILABILITY'}))
         for c in constraints:
             fid = str(c['entity_id'])
             for slot_str in c['data']['unavailable_slots']: # e.g. "Mon_1"
-                self.availability_matrix[fid][slot_str] = True 
+                day, slot = slot_str.split('_')
+                self.mark_busy(fid, day, slot)
                 
         # Load Global Busy State (from OTHER timetables not in this run)
-        other_tts = list(self.db.timetables.find({'batch_id': {'$nin': self.batch_ids}}))
+        other_tts = list(db.timetables.find({'batch_id': {'$nin': self.batch_ids}}))
         for tt in other_tts:
             t_data = tt.get('timetable', {})
             for day in self.days:
                 for slot in self.slots:
                     entry = t_data.get(day, {}).get(slot)
                     if entry:
-                        key_suffix = f"{day}_{slot}"
                         if 'faculty_id' in entry:
-                            self.availability_matrix[entry['faculty_id']][key_suffix] = True
+                            self.mark_busy(entry['faculty_id'], day, slot)
                         if 'room_id' in entry:
-                            self.availability_matrix[entry['room_id']][key_suffix] = True
-                            
-    def initialize_structure(self):
-        for b in self.batches:
-            self.timetables[b['_id']] = {day: {slot: None for slot in self.slots} for day in self.days}
+                            self.mark_busy(entry['room_id'], day, slot)
+
+        # Courses and labs of every batch in two queries (not two per batch)
+        course_ids = {ObjectId(c) for b in self.batches for c in b['courses']}
+        lab_ids = {ObjectId(l) for b in self.batches for l in b['labs']}
+        self.courses = {c['_id']: c for c in db.courses.find({'_id': {'$in': list(course_ids)}})}
+        self.labs = {l['_id']: l for l in db.labs.find({'_id': {'$in': list(lab_ids)}})}
+        self.sessions = self.order_sessions(self.expand_sessions())
+
+    def mark_busy(self, entity_id, day, slot):
+        if day in self.grid.day_index and slot in self.grid.slot_index:
+            self.busy[entity_id] |= 1 << self.grid.index(day, slot)
 
     def expand_sessions(self):
         """Convert courses/labs into schedulable session objects."""
         sessions = []
         for batch in self.batches:
             # Labs
-            labs = list(self.db.labs.find({'_id': {'$in': [ObjectId(l) for l in batch['labs']]}}))
+            labs = [self.labs[ObjectId(l)] for l in batch['labs'] if ObjectId(l) in self.labs]
             for lab in labs:
                 sessions.append({
                     'type': 'LAB',
@@ -100,11 +92,12 @@ class MultiBatchScheduler:
                     'duration': 2,
                     'valid_slots': [(6,7), (7,8), (8,9)], # Avoid (5,6) crossing lunch if Lunch is after 5
                     'faculty_pool': self.get_qualified_faculty(lab, 'qualified_labs'),
-                    'room_pool': [r for r in self.all_rooms if r['type'] == 'Laboratory']
+                    'room_type': 'Laboratory',
+                    'batch_size': int(batch.get('size') or 0)
                 })
             
             # Theory
-            courses = list(self.db.courses.find({'_id': {'$in': [ObjectId(c) for c in batch['courses']]}}))
+            courses = [self.courses[ObjectId(c)] for c in batch['courses'] if ObjectId(c) in self.courses]
             for course in courses:
                 # DEFENSIVE: Skip if it looks like a lab (e.g. 1 credit, name contains Lab, or in labs collection)
                 # Ideally, rely on DB, but 'credits' is a good proxy if labs are 1 and theory > 1
@@ -128,7 +121,8 @@ class MultiBatchScheduler:
                         'duration': 1,
                         'valid_slots': v_slots, # List of single slots
                         'faculty_pool': self.get_qualified_faculty(course, 'qualified_courses'),
-                        'room_pool': [r for r in self.all_rooms if r['type'] == 'Lecture Hall']
+                        'room_type': 'Lecture Hall',
+                        'batch_size': int(batch.get('size') or 0)
                     })
         
         # Sort sessions: Labs first (Hardest), then Theory
@@ -138,21 +132,7 @@ class MultiBatchScheduler:
     def get_qualified_faculty(self, subject, field):
         return [f for f in self.all_faculty if field in f and str(subject['_id']) in f[field]]
 
-    def is_slot_available(self, resource_id, day, slot_list):
-        """Check if resource is available for ALL slots in the list."""
-        for s in slot_list:
-            if self.availability_matrix.get(resource_id, {}).get(f"{day}_{s}"):
-                return False
-        return True
-
-    def allocate(self, strict_mode=True):
-        # Use the instance flag if it's been set, otherwise use the parameter default
-        current_strict_mode = self.strict_mode_flag if hasattr(self, 'strict_mode_flag') else strict_mode
-
-        self.load_data()
-        self.initialize_structure()
-        sessions = self.expand_sessions()
-        
+    def order_sessions(self, sessions):
         # 1. OPTIMIZE ORDERING WITH DSATUR
         try:
             from services.dsatur import build_conflict_graph, dsatur_coloring
@@ -161,15 +141,129 @@ class MultiBatchScheduler:
             for idx, sess in enumerate(sessions):
                 sess['dsatur_color'] = coloring.get(idx, 999)
         except Exception as e:
-            self.log(f"DSATUR Failed: {e}")
+            self.dsatur_error = e
             
         # Sort: Hardest First (Labs), then by Color, then Duration
         # If strict_mode is False, maybe just random? No, sorted is always better.
         sessions.sort(key=lambda x: (0 if x['type'] == 'LAB' else 1, x.get('dsatur_color', 999), -x['duration']))
+        return sessions
+
+
+class MultiBatchScheduler:
+    def __init__(self, db, batch_ids, snapshot=None):
+        # snapshot: ProblemSnapshot shared by every scheduler of a run (loaded here if not given)
+        self.db = db
+        self.snapshot = snapshot or ProblemSnapshot(db, batch_ids)
+        self.batch_ids = self.snapshot.batch_ids
+        self.days = self.snapshot.days
+        self.slots = self.snapshot.slots
+        self.debug_logs = []
+        if getattr(self.snapshot, 'dsatur_error', None):
+            self.log(f"DSATUR Failed: {self.snapshot.dsatur_error}")
+        
+        # Read-only problem data
+        self.batches = self.snapshot.batches
+        self.all_faculty = self.snapshot.all_faculty
+        self.all_rooms = self.snapshot.all_rooms
+        self.rooms_by_type = self.snapshot.rooms_by_type
+        self.room_caps = self.snapshot.room_caps
+
+        # Faculty/room ids are interned to row indices; (day, slot) to a timeslot column
+        self.grid = self.snapshot.grid
+        self.masks = SlotMasks(self.grid)
+        self._slot_masks = {} # (day, slots) -> bitmask, memoised (the same few candidates recur)
+        self.reset()
+
+    def reset(self):
+        """Global allocation state back to the snapshot (nothing of this run allocated)."""
+        self.entities = Interner() # key=entity_id (fac/room) -> row
+        self.busy = [] # entity row -> week bitmask of busy timeslots
+        self.batch_busy = defaultdict(int) # batch_id -> week bitmask of filled timeslots
+        self.daily_load = np.zeros((64, len(self.days)), dtype=np.int16) # fac row x day
+        self.timetables = {} # key=batch_id, val={day: {slot: entry}}
+        self.course_day_usage = defaultdict(lambda: defaultdict(set)) # batch_id -> course_code -> set(days)
         
-        unallocated = []
+        # Hard Constraints Configurations
+        # We model breaks as boundaries. If a 2-hr block crosses a boundary, it's invalid.
+        # Break after Slot 2. Lunch after Slot 5.
+        self.break_boundaries = {2, 5} 
+
+        for entity_id, mask in self.snapshot.busy.items():
+            self.busy[self.entity_row(entity_id)] = mask
+        # Interned rows of the rooms, so find_room tests availability without rebuilding ids
+        self.room_rows = {t: [self.entity_row(str(r['_id'])) for r in rooms] for t, rooms in self.rooms_by_type.items()}
+        self.initialize_structure()
+
+    def entity_row(self, entity_id):
+        """Interned row for a faculty/room id, growing the state matrices as needed."""
+        row = self.entities.add(entity_id)
+        if row >= len(self.busy):
+            self.busy.append(0)
+        if row >= len(self.daily_load):
+            grow = len(self.daily_load)
+            self.daily_load = np.vstack([self.daily_load, np.zeros((grow, len(self.days)), dtype=np.int16)])
+        return row
+
+    def violates_continuous_teaching(self, faculty_id, day, req_slots):
+        """
+        Ensures faculty does NOT teach more than 2 continuous slots.
+        """
+        # Already occupied slots for faculty on this day (Global Availability mask) + proposed slots
+        occupied = self.busy[self.entity_row(faculty_id)] | self.slot_mask(day, req_slots)
+        occupied &= self.masks.day[self.grid.day_index[day]]
+
+        # Check for continuous runs > 2 (any window of 3 fully occupied)
+        return bool(self.masks.runs_of_3(occupied))
         
-        for sess in sessions:
+    def log(self, msg):
+        self.debug_logs.append(msg)
+
+    def initialize_structure(self):
+        for b in self.batches:
+            self.timetables[b['_id']] = {day: {slot: None for slot in self.slots} for day in self.days}
+
+    def is_slot_available(self, resource_id, day, slot_list):
+        """Check if resource is available for ALL slots in the list."""
+        row = self.entities.get(resource_id)
+        if row is None:
+            return True
+        return not self.busy[row] & self.slot_mask(day, slot_list)
+
+    def find_room(self, session, day, slot_list):
+        """
+        Best-fit room: the smallest free room of the session's type that holds
+        the batch. If none is big enough, the biggest free smaller room.
+        """
+        rooms = self.rooms_by_type.get(session['room_type'], [])
+        rows = self.room_rows.get(session['room_type'], [])
+        k = bisect.bisect_left(self.room_caps.get(session['room_type'], []), session['batch_size'])
+        mask = self.slot_mask(day, slot_list)
+        for r in itertools.chain(range(k, len(rooms)), range(k - 1, -1, -1)):
+            if not self.busy[rows[r]] & mask:
+                return rooms[r]
+        return None
+
+    def slot_mask(self, day, slot_list):
+        key = (day, tuple(slot_list))
+        mask = self._slot_masks.get(key)
+        if mask is None:
+            mask = 0
+            for s in slot_list:
+                mask |= 1 << self.grid.index(day, str(s))
+            self._slot_masks[key] = mask
+        return mask
+
+    def allocate(self, strict_mode=True):
+        # Use the instance flag if it's been set, otherwise use the parameter default
+        current_strict_mode = self.strict_mode_flag if hasattr(self, 'strict_mode_flag') else strict_mode
+
+        # Fresh state on every call: population members and retries share only the snapshot
+        self.reset()
+        sessions = self.snapshot.sessions # already expanded and in DSATUR order
+        
+        unallocated = [] # session indices
+        
+        for idx, sess in enumerate(sessions):
             assigned = False
             
             shuffled_days = self.days[:]
@@ -204,19 +298,7 @@ class MultiBatchScheduler:
                     random.shuffle(fac_pool)
 
                     for fac in fac_pool:
-                        fid = str(fac['_id'])
-                        
-                        if not self.is_slot_available(fid, day, req_slots): 
-                            continue
-                        
-                        # Max Load (Hard logic, but maybe relax max load to 5 in non-strict?)
-                        # Let's keep 4 hard for now, unless fallback needed.
-                        limit = 4 if current_strict_mode else 5
-                        if self.daily_load[fid][day] + sess['duration'] > limit: 
-                            continue 
-                        
-                        # Continuous Teaching (SKIP IF RELAXED)
-                        if current_strict_mode and self.violates_continuous_teaching(fid, day, req_slots): 
+                        if not self.can_teach(fac, sess, day, req_slots, current_strict_mode):
                             continue
                         
                         chosen_fac = fac
@@ -226,15 +308,7 @@ class MultiBatchScheduler:
                         continue
                     
                     # 3. Find Room
-                    chosen_room = None
-                    room_pool = sess['room_pool'][:]
-                    random.shuffle(room_pool)
-                    
-                    for room in room_pool:
-                        rid = str(room['_id'])
-                        if self.is_slot_available(rid, day, req_slots):
-                            chosen_room = room
-                            break
+                    chosen_room = self.find_room(sess, day, req_slots)
                             
                     if chosen_fac and chosen_room:
                         # ALLOCATE
@@ -243,11 +317,83 @@ class MultiBatchScheduler:
                         break
             
             if not assigned:
-                unallocated.append(sess)
-                self.log(f"FAILED to allocate {sess['course']['code']}")
+                unallocated.append(idx)
                 # print(f"DEBUG: Failed {sess['course']['code']} Batch {sess['batch_name']}. ValidSlots: {len(sess['valid_slots'])}") # Removed as per instruction
 
-        return self.timetables, unallocated
+        # Failures are left to repair(), which runs once on the final timetable, not per member
+        for idx in unallocated:
+            self.log(f"FAILED to allocate {sessions[idx]['course']['code']}")
+
+        return self.timetables, [sessions[idx] for idx in unallocated]
+
+    def repair(self, timetables, strict_mode=True, max_checks=REPAIR_MAX_CHECKS, time_limit=REPAIR_TIME_LIMIT):
+        """
+        Backtracking repair (MRV + forward checking, see repair.py) of a
+        finished timetable, e.g. the GA's best: the allocation state is rebuilt
+        from its entries and the sessions it is missing are placed where the
+        search can, within `max_checks` fits() evaluations and `time_limit`
+        seconds. Returns (timetables, sessions still unplaced).
+        """
+        from services.repair import BacktrackingRepair, SchedulerModel
+        current_strict_mode = self.strict_mode_flag if hasattr(self, 'strict_mode_flag') else strict_mode
+
+        self.reset()
+        sessions = self.snapshot.sessions
+        # Sessions of one batch and course are interchangeable, so entries match any of them
+        open_sessions = defaultdict(list)
+        for idx in reversed(range(len(sessions))):
+            sess = sessions[idx]
+            open_sessions[(sess['batch_id'], sess['type'], sess['course']['code'])].append(idx)
+        faculty = {str(f['_id']): f for f in self.all_faculty}
+        rooms = {str(r['_id']): r for r in self.all_rooms}
+
+        placements = {} # session index -> ((day, slots, faculty id), room)
+        for batch_id, days in timetables.items():
+            for day in self.days:
+                row = days.get(day, {})
+                k = 0
+                while k < len(self.slots):
+                    entry = row.get(self.slots[k])
+                    # A lab's entry fills its first slot and the next one
+                    length = 2 if entry and entry['type'] == 'LAB' else 1
+                    req_slots = self.slots[k:k + length]
+                    k += length
+                    if not entry:
+                        continue
+                    matches = open_sessions.get((batch_id, entry['type'], entry['code']))
+                    fac, room = faculty.get(entry['faculty_id']), rooms.get(entry['room_id'])
+                    if not matches or fac is None or room is None:
+                        continue
+                    idx = matches.pop()
+                    self.register_allocation(sessions[idx], day, req_slots, fac, room)
+                    placements[idx] = ((day, tuple(req_slots), entry['faculty_id']), room)
+
+        unplaced = [idx for idx in range(len(sessions)) if idx not in placements]
+        if unplaced:
+            model = SchedulerModel(self, sessions, placements, current_strict_mode)
+            failed = BacktrackingRepair(model, max_checks=max_checks, time_limit=time_limit).run(unplaced)
+            self.log(f"Repair: placed {len(unplaced) - len(failed)} of {len(unplaced)} failed sessions")
+            unplaced = failed
+        return self.timetables, [sessions[idx] for idx in unplaced]
+
+    def can_teach(self, fac, sess, day, req_slots, strict_mode=True):
+        """Whether faculty `fac` is free for `req_slots` on `day` within their load/continuity limits."""
+        fid = str(fac['_id'])
+        
+        if not self.is_slot_available(fid, day, req_slots): 
+            return False
+        
+        # Max Load (Hard logic, but maybe relax max load to 5 in non-strict?)
+        # Let's keep 4 hard for now, unless fallback needed.
+        limit = 4 if strict_mode else 5
+        row = self.entity_row(fid) # may grow daily_load, so before indexing it
+        if self.daily_load[row, self.grid.day_index[day]] + sess['duration'] > limit: 
+            return False
+        
+        # Continuous Teaching (SKIP IF RELAXED)
+        if strict_mode and self.violates_continuous_teaching(fid, day, req_slots): 
+            return False
+        return True
 
     def is_clean_batch_slot(self, batch_id, day, req_slots):
         tt = self.timetables[batch_id][day]
@@ -262,28 +408,24 @@ class MultiBatchScheduler:
 
     def batch_has_large_gap(self, batch_id, day, req_slots):
         """Avoids creating gaps > 2 slots."""
-        tt = self.timetables[batch_id][day]
-        occupied = sorted([int(s) for s,v in tt.items() if v])
+        day_mask = self.masks.day[self.grid.day_index[day]]
+        occupied = self.batch_busy[batch_id] & day_mask
         
         if not occupied: return False # First slot is always fine
 
         # Add proposed
-        for s in req_slots: occupied.append(int(s))
-        occupied.sort()
-
-        # Check gaps
-        for i in range(1, len(occupied)):
-            if occupied[i] - occupied[i-1] > 2: # strict gap > 1? User said > 2 is ugly.
-                # Allow gap of 1 (Reasonable break), Gap of 2 is pushing it.
-                return True
-        return False
+        occupied |= self.slot_mask(day, req_slots)
+
+        # Gap > 2 between neighbouring slots = 2 empty slots in a row between the first and last one
+        # (strict gap > 1? User said > 2 is ugly. Allow gap of 1 (Reasonable break), Gap of 2 is pushing it.)
+        span = ((1 << occupied.bit_length()) - 1) & ~((occupied & -occupied) - 1)
+        empty = span & ~occupied
+        return bool(empty & (empty >> 1))
 
     def is_clean_batch_slot_v2(self, batch_id, day, req_slots, session):
-        tt = self.timetables[batch_id][day]
-        
         # 1. Slot must be empty
-        for s in req_slots:
-            if tt.get(s): return False
+        if self.batch_busy[batch_id] & self.slot_mask(day, req_slots):
+            return False
             
         # 2. Same Theory Course only once per day (Using tracked set)
         if session['type'] == 'THEORY':
@@ -307,73 +449,161 @@ class MultiBatchScheduler:
             "room_id": rid
         }
         
+        mask = self.slot_mask(day, slots)
         for s in slots:
             # 1. Update Batch Timetable
             self.timetables[session['batch_id']][day][s] = entry
+        self.batch_busy[session['batch_id']] |= mask
             
-            # 2. Update Global Availability Matrix
-            key_suffix = f"{day}_{s}"
-            self.availability_matrix[fid][key_suffix] = True
-            self.availability_matrix[rid][key_suffix] = True
+        # 2. Update Global Availability Matrix
+        self.busy[self.entity_row(fid)] |= mask
+        self.busy[self.entity_row(rid)] |= mask
             
         # 3. Update Load
-        self.daily_load[fid][day] += session['duration']
+        row = self.entity_row(fid)
+        self.daily_load[row, self.grid.day_index[day]] += session['duration']
         
         # 4. Update Course Usage
         if session['type'] == 'THEORY':
             self.course_day_usage[session['batch_id']][session['course']['code']].add(day)
 
+    def unregister_allocation(self, session, day, slots, faculty, room):
+        """Reverts register_allocation (the repair lifts sessions to move them)."""
+        fid = str(faculty['_id'])
+        rid = str(room['_id'])
+        mask = self.slot_mask(day, slots)
+        
+        for s in slots:
+            self.timetables[session['batch_id']][day][s] = None
+        self.batch_busy[session['batch_id']] &= ~mask
+        # The cells were free before the allocation, so clearing them restores the masks
+        self.busy[self.entity_row(fid)] &= ~mask
+        self.busy[self.entity_row(rid)] &= ~mask
+        row = self.entity_row(fid)
+        self.daily_load[row, self.grid.day_index[day]] -= session['duration']
+        
+        if session['type'] == 'THEORY':
+            self.course_day_usage[session['batch_id']][session['course']['code']].discard(day)
+
     def validate_final_timetable(self):
         """Final sanity check before commit."""
         errors = []
-        for fid, daily in self.daily_load.items():
-            for day, load in daily.items():
-                if load > 4:
-                    errors.append(f"Faculty {fid} Overload on {day}: {load} hours")
+        for row, d in zip(*np.nonzero(self.daily_load[:len(self.entities)] > 4)):
+            fid, day = self.entities.names[row], self.days[d]
+            errors.append(f"Faculty {fid} Overload on {day}: {self.daily_load[row, d]} hours")
         
         # Check continuity, room conflicts etc if needed explicitly
         return errors
 
+# Process pool workers: the snapshot is installed once per worker, tasks only carry a seed
+_worker_snapshot = None
+
+def _init_worker(snapshot):
+    global _worker_snapshot
+    _worker_snapshot = snapshot
+
+def _allocate_member(seed, strict_mode=True):
+    """Worker: one randomised allocate() (a population member) from the shared snapshot."""
+    random.seed(seed)
+    scheduler = MultiBatchScheduler(None, _worker_snapshot.batch_ids, _worker_snapshot)
+    tt, _ = scheduler.allocate(strict_mode=strict_mode)
+    return tt
+
 # Wrapper function to be called by optimization engine
-def create_unified_timetable(batch_ids, db, min_fitness=0):
-    from services.ga_optimizer import GeneticOptimizer
-    import traceback
+def create_unified_timetable(batch_ids, db, min_fitness=0, time_limit=None, stagnation=None, workers=None):
+    """
+    time_limit: optional wall-clock budget (seconds) for all attempts together.
+    stagnation: optional number of GA generations without improvement before an attempt stops.
+    workers: processes allocating population members (default: one per CPU).
+    Without them: 3 attempts of 5 generations. With a time limit, attempts keep
+    running until the deadline (or min_fitness) and the best one so far is returned.
+
+    The allocate() runs of every attempt's population are independent, so they
+    are queued on a process pool up front (distinct seeds, one shared snapshot)
+    and each attempt evolves as soon as its members are in. Reaching
+    min_fitness cancels the members still queued. Waiting for members never
+    outlasts the time limit: at the deadline the best attempt so far is
+    returned, or, before any attempt finished, the members that are ready.
+    """
+    import os
+    import multiprocessing as mp
+    from collections import deque
+    from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+    from services.ga_optimizer import GeneticOptimizer, POPULATION_SIZE
+    from services.search_budget import SearchBudget
+    from services.ga_config import POOL_START_METHOD
     
     best_overall = None
     best_score = float('-inf')
     best_curve = []
 
     # Retry loop (Outer quality assurance)
-    max_retries = 3
-    for attempt in range(max_retries):
-        print(f"DEBUG: Optimization Attempt {attempt+1}/{max_retries}")
+    max_retries = None if time_limit else 3
+    budget = SearchBudget(time_limit=time_limit, max_steps=max_retries)
+    attempt = 0
+    # One database read for the whole run; every attempt starts from the same snapshot
+    snapshot = ProblemSnapshot(db, batch_ids)
+    scheduler = MultiBatchScheduler(db, batch_ids, snapshot)
+    strict = getattr(scheduler, 'strict_mode_flag', True)
+    workers = workers or os.cpu_count() or 1
+    # Attempts queued ahead: all of them with a fixed count, else enough to keep the pool busy
+    ahead = max_retries or max(2, -(-workers // POPULATION_SIZE) + 1)
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=mp.get_context(POOL_START_METHOD),
+                               initializer=_init_worker, initargs=(snapshot,))
+    queued = deque() # population futures per attempt, oldest first
+    try:
+        while not budget.exhausted():
+            while len(queued) < ahead and (max_retries is None or attempt + len(queued) < max_retries):
+                queued.append([pool.submit(_allocate_member, random.getrandbits(32), strict)
+                               for _ in range(POPULATION_SIZE)])
+            members = queued.popleft()
+            attempt += 1
+            budget.step()
+            scheduler.log(f"Optimization Attempt {attempt}/{max_retries or '-'}")
         
-        try:
-            # New Scheduler Instance per attempt
-            scheduler = MultiBatchScheduler(db, batch_ids)
-            ga = GeneticOptimizer(scheduler, generations=5) # Short generations for speed in demo
+            try:
+                ready, pending = wait(members, timeout=budget.remaining())
+                if pending:
+                    if best_overall is not None:
+                        scheduler.log(f"Time budget spent waiting for attempt {attempt}; keeping the best so far")
+                        break
+                    # Nothing to return yet: evolve whatever members are ready
+                    if not ready:
+                        ready, _ = wait(members, return_when=FIRST_COMPLETED)
+                    members = [f for f in members if f.done()]
+                generations = None if time_limit or stagnation else 5 # Short generations for speed in demo
+                ga = GeneticOptimizer(scheduler, generations=generations)
             
-            tt, curve = ga.run(log_fn=lambda m: scheduler.log(m))
+                tt, curve = ga.run(log_fn=lambda m: scheduler.log(m),
+                                   budget=budget.child(stagnation=stagnation, max_steps=generations),
+                                   population=[f.result() for f in members])
             
-            # Check if empty solution returned
-            if not curve:
-                print("DEBUG: GA returned no curve/result.")
-                continue
+                # Check if empty solution returned
+                if not curve:
+                    scheduler.log(f"Attempt {attempt}: GA returned no result")
+                    continue
                 
-            score = curve[-1]
-            print(f"DEBUG: Attempt {attempt+1} Score: {score}")
+                score = curve[-1]
+                scheduler.log(f"Attempt {attempt} Score: {score}")
 
-            if score > best_score:
-                best_score = score
-                best_overall = tt
-                best_curve = curve
+                if score > best_score:
+                    best_score = score
+                    best_overall = tt
+                    best_curve = curve
 
-            # Threshold check (tuning required to know what's 'good')
-            if score >= min_fitness and min_fitness > 0:
-                break
-        except Exception as e:
-            print(f"DEBUG: EXCEPTION in Optimization Attempt: {e}")
-            traceback.print_exc()
+                # Threshold check (tuning required to know what's 'good')
+                if score >= min_fitness and min_fitness > 0:
+                    break
+            except Exception as e:
+                scheduler.log(f"Optimization Attempt {attempt} failed: {e}")
+    finally:
+        # Early stop (min_fitness / deadline): drop the queued members, don't wait for running ones
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    # Repair the sessions the winner is missing: once, here, rather than in every member
+    if best_overall is not None:
+        best_overall, _ = scheduler.repair(best_overall, strict)
 
     return best_overall, best_curve
 
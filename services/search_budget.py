@@ -0,0 +1,75 @@
+import time
+
+
+class SearchBudget:
+    """
+    Stopping rule for the anytime search engines.
+
+    An engine counts its steps (iterations, generations, ...) through step()
+    and stops once any configured limit is hit:
+      - time_limit: wall-clock seconds since start()
+      - stagnation: steps in a row without a new best
+      - max_steps:  hard cap on the number of steps
+    A limit of None is not enforced. Engines always keep their best-so-far
+    solution, so stopping early still returns a usable timetable.
+    """
+
+    def __init__(self, time_limit=None, stagnation=None, max_steps=None):
+        self.time_limit = time_limit
+        self.stagnation = stagnation
+        self.max_steps = max_steps
+        self.start()
+
+    def start(self):
+        self.started = time.monotonic()
+        self.steps = 0
+        self.last_improvement = 0
+        return self
+
+    def restore(self, steps=0, elapsed=0.0):
+        """Continues a checkpointed search: `steps` already done, `elapsed` seconds already spent."""
+        self.started = time.monotonic() - elapsed
+        self.steps = steps
+        self.last_improvement = steps
+        return self
+
+    @property
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def remaining(self):
+        """Seconds left, or None without a time limit."""
+        if self.time_limit is None:
+            return None
+        return max(0.0, self.time_limit - self.elapsed)
+
+    def step(self, improved=False):
+        self.steps += 1
+        if improved:
+            self.last_improvement = self.steps
+
+    def reason(self):
+        """Why the search should stop, or None to keep going."""
+        if self.max_steps is not None and self.steps >= self.max_steps:
+            return f"step limit ({self.max_steps})"
+        if self.time_limit is not None and self.elapsed >= self.time_limit:
+            return f"time budget ({self.time_limit:.1f}s)"
+        if self.stagnation is not None and self.steps - self.last_improvement >= self.stagnation:
+            return f"no improvement for {self.stagnation} steps"
+        return None
+
+    def exhausted(self):
+        return self.reason() is not None
+
+    def fraction(self):
+        """Progress towards the closest hard limit (0..1); 0 when only stagnation is set."""
+        done = 0.0
+        if self.max_steps:
+            done = max(done, self.steps / self.max_steps)
+        if self.time_limit:
+            done = max(done, self.elapsed / self.time_limit)
+        return min(1.0, done)
+
+    def child(self, stagnation=None, max_steps=None):
+        """A budget for a sub-search that ends no later than this one."""
+        return SearchBudget(time_limit=self.remaining(), stagnation=stagnation, max_steps=max_steps)